@@ -0,0 +1,322 @@
+"""
+Calculs hors ligne sur le graphe social (PageRank, communautés), lancés par
+les commandes flask.
+
+Le graphe est lu page par page, converti en tableaux d'entiers compacts
+(une arête = deux entiers), puis les scores sont calculés en mémoire et
+réécrits dans Neo4j par lots.
+"""
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+import heapq
+import os
+import resource
+import time
+
+from models import evaluate, run, run_batches, BATCH_SIZE
+import queries
+
+# Nombre d'utilisateurs lus par requête
+PAGE_SIZE = 10000
+
+def peak_memory_mb():
+    # ru_maxrss est exprimé en kilo-octets sous Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def _numpy():
+    # NumPy est facultatif : sans lui, le calcul se fait avec des array
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+class UserGraph:
+    """
+    The user graph as edge arrays: edge k goes from sources[k] to targets[k],
+    both indexes into ids.
+    """
+    def __init__(self):
+        self.ids = []
+        self.index = {}
+        self.sources = array("i")
+        self.targets = array("i")
+
+    def node(self, user_id):
+        position = self.index.get(user_id)
+        if position is None:
+            position = self.index[user_id] = len(self.ids)
+            self.ids.append(user_id)
+        return position
+
+    def memory_mb(self):
+        # Taille des tableaux d'arêtes, hors dictionnaire des ids
+        return (self.sources.itemsize * len(self.sources)
+                + self.targets.itemsize * len(self.targets)) / 1024 / 1024
+
+    def adjacency(self):
+        """
+        Group the edges by source (compressed sparse rows): the targets of
+        node i are neighbours[offsets[i]:offsets[i + 1]].
+        :return: The (offsets, neighbours) arrays.
+        """
+        n = len(self.ids)
+        offsets = array("l", [0]) * (n + 1)
+        for source in self.sources:
+            offsets[source + 1] += 1
+        for i in range(n):
+            offsets[i + 1] += offsets[i]
+        neighbours = array("i", [0]) * len(self.targets)
+        positions = offsets[:-1]
+        for source, target in zip(self.sources, self.targets):
+            neighbours[positions[source]] = target
+            positions[source] += 1
+        return offsets, neighbours
+
+def load_user_graph(page_size=PAGE_SIZE, progress=None, query=queries.USER_EDGES_PAGE):
+    """
+    Read the users and their edges, one page of users per query.
+    By default FRIENDS_WITH counts in both directions and liking a post or a
+    comment adds an edge to its author.
+    :param page_size: The number of users read per query.
+    :param progress: Optional callable receiving progress messages.
+    :param query: The page query, returning the user id then lists of target ids.
+    :return: A UserGraph.
+    """
+    graph = UserGraph()
+    after = ""
+    while True:
+        cursor = run(query, after=after, limit=page_size)
+        count = 0
+        for user_id, *edges in cursor:
+            source = graph.node(user_id)
+            for target_ids in edges:
+                for target_id in target_ids:
+                    graph.sources.append(source)
+                    graph.targets.append(graph.node(target_id))
+            after = user_id
+            count += 1
+        if progress:
+            progress(f"Loaded {len(graph.ids)} users, {len(graph.sources)} edges "
+                     f"({graph.memory_mb():.1f} MB of edges, peak {peak_memory_mb():.0f} MB)")
+        if count < page_size:
+            return graph
+
+def pagerank(graph, damping=0.85, max_iterations=50, tolerance=1e-6, progress=None):
+    """
+    Compute PageRank by power iteration. The rank of users without outgoing
+    edges is spread evenly over all users.
+    :param graph: A UserGraph.
+    :param damping: The probability of following an edge.
+    :param max_iterations: The maximum number of iterations.
+    :param tolerance: Stop when the L1 change between iterations is below it.
+    :param progress: Optional callable receiving progress messages.
+    :return: The scores, in the order of graph.ids, summing to 1.
+    """
+    n = len(graph.ids)
+    if n == 0:
+        return []
+    numpy = _numpy()
+    step = _numpy_step(graph, numpy) if numpy else _array_step(graph)
+    ranks = [1 / n] * n if numpy is None else numpy.full(n, 1 / n)
+    for iteration in range(1, max_iterations + 1):
+        ranks, delta = step(ranks, damping)
+        if progress:
+            progress(f"Iteration {iteration}: delta {delta:.2e}")
+        if delta < tolerance:
+            break
+    return list(ranks) if numpy is None else ranks.tolist()
+
+def _numpy_step(graph, numpy):
+    n = len(graph.ids)
+    sources = numpy.frombuffer(graph.sources, dtype=numpy.int32)
+    targets = numpy.frombuffer(graph.targets, dtype=numpy.int32)
+    degrees = numpy.bincount(sources, minlength=n).astype(numpy.float64)
+    dangling = degrees == 0
+    degrees[dangling] = 1
+
+    def step(ranks, damping):
+        shares = numpy.bincount(targets, weights=(ranks / degrees)[sources], minlength=n)
+        base = (1 - damping + damping * ranks[dangling].sum()) / n
+        updated = base + damping * shares
+        return updated, float(numpy.abs(updated - ranks).sum())
+    return step
+
+def _array_step(graph):
+    n = len(graph.ids)
+    degrees = array("i", [0]) * n
+    for source in graph.sources:
+        degrees[source] += 1
+    dangling = [i for i in range(n) if degrees[i] == 0]
+    edges = list(zip(graph.sources, graph.targets))
+
+    def step(ranks, damping):
+        shares = array("d", [0.0]) * n
+        for source, target in edges:
+            shares[target] += ranks[source] / degrees[source]
+        base = (1 - damping + damping * sum(ranks[i] for i in dangling)) / n
+        updated = [base + damping * share for share in shares]
+        return updated, sum(abs(a - b) for a, b in zip(updated, ranks))
+    return step
+
+def save_pagerank(graph, ranks, batch_size=BATCH_SIZE, progress=None):
+    """
+    Write the scores to the pagerank property of each user, one transaction
+    per batch.
+    :return: The number of properties set.
+    """
+    written = 0
+    for start in range(0, len(ranks), batch_size):
+        rows = [{"id": user_id, "pagerank": rank} for user_id, rank
+                in zip(graph.ids[start:start + batch_size], ranks[start:start + batch_size])]
+        written += run_batches(queries.USER_SET_PAGERANK, rows, ("id", "pagerank"),
+                               batch_size).get("properties_set", 0)
+        if progress:
+            progress(f"Saved {min(start + batch_size, len(ranks))}/{len(ranks)} scores")
+    return written
+
+def compute_pagerank(page_size=PAGE_SIZE, batch_size=BATCH_SIZE, damping=0.85,
+                     max_iterations=50, tolerance=1e-6, progress=None):
+    """
+    Load the user graph, compute PageRank and write the scores back.
+    :return: A report with the graph size, the duration, the peak memory
+             and the ten users with the highest score.
+    """
+    start = time.perf_counter()
+    graph = load_user_graph(page_size, progress)
+    ranks = pagerank(graph, damping, max_iterations, tolerance, progress)
+    save_pagerank(graph, ranks, batch_size, progress)
+    top = heapq.nlargest(10, zip(ranks, graph.ids))
+    return {"users": len(graph.ids), "edges": len(graph.sources),
+            "duration_s": time.perf_counter() - start,
+            "peak_memory_mb": peak_memory_mb(),
+            "top": [{"id": user_id, "pagerank": rank} for rank, user_id in top]}
+
+# Adjacence partagée avec les processus du pool (copiée une fois par worker)
+_adjacency = None
+
+def _share_adjacency(offsets, neighbours):
+    global _adjacency
+    _adjacency = (offsets, neighbours)
+
+def _relabel(bounds, labels):
+    # Chaque nœud prend l'étiquette la plus fréquente chez ses voisins ; la
+    # sienne compte une fois, et la plus petite l'emporte en cas d'égalité
+    offsets, neighbours = _adjacency
+    start, end = bounds
+    updated = array("i")
+    for node in range(start, end):
+        counts = {labels[node]: 1}
+        for k in range(offsets[node], offsets[node + 1]):
+            label = labels[neighbours[k]]
+            counts[label] = counts.get(label, 0) + 1
+        updated.append(min(counts, key=lambda label: (-counts[label], label)))
+    return updated
+
+def label_propagation(graph, max_iterations=20, workers=None, progress=None):
+    """
+    Detect communities by synchronous label propagation. Each iteration
+    splits the nodes into one contiguous partition per worker process.
+    :param graph: A UserGraph, with edges in both directions.
+    :param max_iterations: The maximum number of iterations.
+    :param workers: The number of processes (default: CPU count, 1: no pool).
+    :param progress: Optional callable receiving progress messages.
+    :return: The label of each node, in the order of graph.ids; a label is
+             the index of one node of the community.
+    """
+    n = len(graph.ids)
+    labels = array("i", range(n))
+    if n == 0:
+        return labels
+    offsets, neighbours = graph.adjacency()
+    workers = min(workers or os.cpu_count() or 1, n)
+    partitions = [(n * k // workers, n * (k + 1) // workers) for k in range(workers)]
+    pool = None
+    if workers > 1:
+        pool = ProcessPoolExecutor(workers, initializer=_share_adjacency,
+                                   initargs=(offsets, neighbours))
+    else:
+        _share_adjacency(offsets, neighbours)
+    try:
+        for iteration in range(1, max_iterations + 1):
+            if pool:
+                parts = pool.map(_relabel, partitions, repeat(labels))
+            else:
+                parts = [_relabel(partitions[0], labels)]
+            updated = array("i")
+            for part in parts:
+                updated.extend(part)
+            changed = sum(1 for old, new in zip(labels, updated) if old != new)
+            labels = updated
+            if progress:
+                progress(f"Iteration {iteration}: {changed} labels changed "
+                         f"(peak {peak_memory_mb():.0f} MB)")
+            if not changed:
+                break
+    finally:
+        if pool:
+            pool.shutdown()
+        _share_adjacency(None, None)
+    return labels
+
+def save_communities(rows, batch_size=BATCH_SIZE, progress=None):
+    """
+    Write the community property of each user, one transaction per batch,
+    and clear their community_stale flag.
+    :param rows: A list of {"id", "community"} dictionaries.
+    """
+    for start in range(0, len(rows), batch_size):
+        run_batches(queries.USER_SET_COMMUNITY, rows[start:start + batch_size],
+                    ("id", "community"), batch_size)
+        if progress:
+            progress(f"Saved {min(start + batch_size, len(rows))}/{len(rows)} communities")
+
+def compute_communities(page_size=PAGE_SIZE, batch_size=BATCH_SIZE, max_iterations=20,
+                        workers=None, progress=None):
+    """
+    Load the friendship graph, detect communities and write them back.
+    A community is named after the id of one of its members.
+    :return: A report with the graph size, the number of communities, the
+             duration and the peak memory.
+    """
+    start = time.perf_counter()
+    graph = load_user_graph(page_size, progress, queries.USER_FRIENDS_PAGE)
+    labels = label_propagation(graph, max_iterations, workers, progress)
+    save_communities([{"id": user_id, "community": graph.ids[label]}
+                      for user_id, label in zip(graph.ids, labels)], batch_size, progress)
+    return {"users": len(graph.ids), "edges": len(graph.sources),
+            "communities": len(set(labels)),
+            "duration_s": time.perf_counter() - start,
+            "peak_memory_mb": peak_memory_mb()}
+
+def relabel_stale_communities(batch_size=BATCH_SIZE, passes=3, progress=None):
+    """
+    Re-label only the users whose friendships changed since the last run,
+    from the current communities of their friends.
+    :param batch_size: The number of users re-labelled per query.
+    :param passes: The number of propagation passes within a batch.
+    :param progress: Optional callable receiving progress messages.
+    :return: The number of re-labelled users.
+    """
+    relabelled = 0
+    while True:
+        rows = evaluate(queries.USER_STALE_COMMUNITY, limit=batch_size)
+        if not rows:
+            return relabelled
+        current = {}
+        for _ in range(passes):
+            for user_id, friends in rows:
+                counts = {}
+                for friend_id, community in friends:
+                    label = current.get(friend_id, community)
+                    if label is not None:
+                        counts[label] = counts.get(label, 0) + 1
+                # Sans ami étiqueté, l'utilisateur forme sa propre communauté
+                current[user_id] = (min(counts, key=lambda label: (-counts[label], label))
+                                    if counts else user_id)
+        save_communities([{"id": user_id, "community": current[user_id]}
+                          for user_id, _ in rows], batch_size)
+        relabelled += len(rows)
+        if progress:
+            progress(f"Re-labelled {relabelled} users")
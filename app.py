@@ -1,33 +1,205 @@
-from flask import Flask, request, jsonify
-from models import User, Post, Comment
-import json
+from flask import Blueprint, Config, Flask, abort, current_app, g, make_response, request, jsonify
+from commands import commands
+from models import (User, Post, Comment, build_existence_filter, current_id, find_by_ids, find_many,
+                    is_supernode, top_degree, warmup, MAX_RESULTS)
+import existence
+import httpstats
+import singleflight
+import querystats
+import queries
+from datetime import datetime
+from pytz import utc
+import os
+import time
 
-app = Flask(__name__)
+api = Blueprint("api", __name__)
+
+def load_config(config=None, defaults=None):
+    """
+    Build the application configuration: defaults, then FLASK_* environment
+    variables, then the given overrides.
+    :param config: Optional configuration overrides, e.g. {"WARMUP": False}.
+    :param defaults: Optional defaults of the caller, e.g. server.py.
+    :return: A flask Config.
+    """
+    settings = Config(".")
+    # WARMUP None : préchauffage sauf pour les commandes flask
+    settings.from_mapping(WARMUP=None, EXISTENCE_FILTER=False)
+    settings.update(defaults or {})
+    # Variables d'environnement FLASK_*, par exemple FLASK_WARMUP=false
+    settings.from_prefixed_env()
+    if config:
+        settings.update(config)
+    return settings
+
+def in_flask_cli():
+    # La commande flask positionne cette variable avant de charger l'application
+    return os.environ.get("FLASK_RUN_FROM_CLI") == "true"
+
+def create_app(config=None):
+    """
+    Create the Flask application.
+    The Neo4j connection is opened lazily by each process, so creating the
+    app does not require Neo4j unless WARMUP or EXISTENCE_FILTER is enabled.
+    Flask commands (flask --app app ...) skip the warmup unless
+    FLASK_WARMUP=true, and never build the existence filter.
+    :param config: Optional configuration overrides, e.g. {"WARMUP": False}.
+    :return: A Flask application.
+    """
+    app = Flask(__name__)
+    app.config.update(load_config(config))
+    app.register_blueprint(api)
+    app.register_blueprint(commands)
+
+    # Préchauffe le cache de plans Neo4j (EXPLAIN de chaque requête) avant
+    # d'accepter du trafic ; les erreurs de syntaxe ou de schéma remontent ici
+    warm = app.config["WARMUP"]
+    if warm is None:
+        warm = not in_flask_cli()
+    if warm:
+        report = warmup()
+        app.extensions["warmup_report"] = report
+        app.logger.warning("Warmup: %d statements explained in %.0f ms, %d failed",
+                           report["statements"], report["duration_ms"],
+                           len(report["failures"]))
+        for name, error in report["failures"].items():
+            app.logger.error("Warmup failed for %s: %s", name, error)
+
+    # Filtre des ids et emails existants, sur demande seulement : il ne voit
+    # pas les écritures des autres processus. Déjà construit (et partagé) si
+    # le processus maître de server.py l'a fait avant le fork ; jamais pour
+    # les commandes flask, qui n'en ont pas l'usage
+    if app.config["EXISTENCE_FILTER"] and not existence.ready() and not in_flask_cli():
+        report = build_existence_filter()
+        app.logger.warning("Existence filter: %d bytes, built in %.0f ms",
+                           report["filter"]["memory_bytes"], report["build"]["duration_ms"])
+    return app
+
+# Types que jsonify sait encoder directement
+JSON_SCALARS = (str, int, float, bool, type(None))
+
+def to_json_value(value):
+    # Dates (datetime ou DateTime de Neo4j) au format ISO 8601, le reste en
+    # texte ; les listes et dictionnaires imbriqués sont convertis récursivement
+    if isinstance(value, JSON_SCALARS):
+        return value
+    if isinstance(value, dict):
+        return {k: to_json_value(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [to_json_value(v) for v in value]
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return str(value)
+
+def parse_time(value):
+    """
+    Parse an ISO 8601 date or datetime; values without an offset are UTC.
+    :param value: The string to parse, e.g. "2024-05-01T12:00:00+02:00".
+    :return: An aware datetime in UTC.
+    :raises ValueError: If the string is not a valid date.
+    """
+    moment = datetime.fromisoformat(value)
+    if moment.tzinfo is None:
+        return moment.replace(tzinfo=utc)
+    return moment.astimezone(utc)
+
+def time_window_args():
+    # ?since=...&until=... : fenêtre de temps sur created_at (until exclu)
+    return {key: parse_time(request.args[key]) for key in ("since", "until")
+            if request.args.get(key)}
+
+TIME_WINDOW_ERROR = "since and until must be ISO 8601 dates"
+
+def fields_arg(label):
+    """
+    Read ?fields=id,title: the properties to return for each node.
+    Answers 400 if a property is not in queries.FIELDS[label].
+    :param label: The label of the returned nodes.
+    :return: A list of property names, or None for all properties.
+    """
+    fields = [field for field in request.args.get("fields", "").split(",") if field]
+    unknown = [field for field in fields if field not in queries.FIELDS[label]]
+    if unknown:
+        abort(make_response(jsonify({"error": f"Unknown fields for {label}: {', '.join(unknown)}",
+                                     "allowed": list(queries.FIELDS[label])}), 400))
+    return fields or None
+
+def batch_get(label, ids):
+    """
+    Answer a multi-get: the nodes in the order of ids, each missing id
+    replaced by {"id": ..., "missing": true}.
+    """
+    if not isinstance(ids, list) or not all(isinstance(node_id, str) for node_id in ids):
+        return jsonify({"error": "ids must be a list of ids"}), 400
+    if len(ids) > MAX_RESULTS:
+        return jsonify({"error": f"At most {MAX_RESULTS} ids can be fetched at once"}), 400
+    fields = fields_arg(label)
+    try:
+        nodes = find_many(label, ids, fields)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+    return jsonify([node_to_dict(node) if node is not None else {"id": node_id, "missing": True}
+                    for node_id, node in zip(ids, nodes)])
+
+def ids_arg():
+    # ?ids=a,b,c
+    return [node_id for node_id in request.args["ids"].split(",") if node_id]
+
+def ids_body():
+    # {"ids": [...]} ; un autre corps (liste, JSON invalide) donne None,
+    # que batch_get refuse avec un 400
+    data = request.get_json(silent=True)
+    return data.get("ids") if isinstance(data, dict) else None
+
+def limit_arg(name="limit", default=None):
+    # Une limite négative ferait échouer LIMIT côté Neo4j : ramenée à 0
+    limit = request.args.get(name, default, type=int)
+    return None if limit is None else max(limit, 0)
+
+# Label des ids passés dans l'URL, par nom de paramètre
+URL_ID_LABELS = {"user_id": "User", "friend_id": "User", "other_id": "User",
+                 "post_id": "Post", "comment_id": "Comment"}
+
+@api.url_value_preprocessor
+def remap_legacy_ids(endpoint, values):
+    # Les UUID4 d'avant `flask migrate-ids` (legacy_id) désignent toujours
+    # le même nœud : remplacés par son id actuel avant d'appeler la route
+    for name, value in (values or {}).items():
+        if name in URL_ID_LABELS:
+            values[name] = current_id(URL_ID_LABELS[name], value)
+
+# Durée et taille de chaque réponse, par route (voir /admin/endpoints)
+@api.before_request
+def start_timer():
+    g.start = time.perf_counter()
+
+@api.after_request
+def record_response(response):
+    if request.url_rule is not None:
+        httpstats.record(f"{request.method} {request.url_rule.rule}", "fields" in request.args,
+                         time.perf_counter() - g.start, response.content_length or 0)
+    return response
 
 # Helper function to convert Neo4j nodes to dictionaries
 def node_to_dict(node):
-    import json
-    
     # Si c'est None, retourner un dictionnaire vide
     if node is None:
         return {}
     
     # Pour les dictionnaires, la façon la plus sûre est de les filtrer pour ne garder que les données sérialisables
     if isinstance(node, dict):
-        try:
-            # Tester si le dictionnaire est JSON sérialisable
-            json.dumps(node)
+        # Cas courant (properties(n)) : valeurs scalaires, rien à convertir
+        if all(isinstance(v, JSON_SCALARS) for v in node.values()):
             return node
-        except TypeError:
-            # Si non sérialisable, filtrer les valeurs non sérialisables
-            return {k: str(v) if not isinstance(v, (str, int, float, bool, type(None))) else v 
-                   for k, v in node.items()}
+        # Sinon (dates, listes et dictionnaires imbriqués) : conversion
+        # récursive, moins coûteuse qu'un essai de json.dumps qui échoue
+        return to_json_value(node)
     
     # Pour les objets avec __dict__ (comme vos classes modèles)  
     if hasattr(node, '__dict__'):
         obj_dict = {k: v for k, v in node.__dict__.items() if not k.startswith('_')}
         # Filtrer les valeurs non sérialisables
-        return {k: str(v) if not isinstance(v, (str, int, float, bool, type(None), dict, list)) else v 
+        return {k: to_json_value(v) if not isinstance(v, (str, int, float, bool, type(None), dict, list)) else v 
                 for k, v in obj_dict.items()}
     
     # Pour les objets py2neo Node
@@ -38,12 +210,23 @@ def node_to_dict(node):
         return {"data": str(node)}
     
 # Routes for Users
-@app.route("/users", methods=["GET"])
+@api.route("/users", methods=["GET"])
 def get_users():
-    users = User.find_all()
+    # ?ids=a,b,c : ces utilisateurs seulement, dans l'ordre demandé
+    if "ids" in request.args:
+        return batch_get("User", ids_arg())
+    try:
+        window = time_window_args()
+    except ValueError:
+        return jsonify({"error": TIME_WINDOW_ERROR}), 400
+    users = User.find_all(fields=fields_arg("User"), **window)
     return jsonify([node_to_dict(user) for user in users])
 
-@app.route("/users", methods=["POST"])
+@api.route("/users:batchGet", methods=["POST"])
+def batch_get_users():
+    return batch_get("User", ids_body())
+
+@api.route("/users", methods=["POST"])
 def create_user():
     data = request.json
     if not data or not data.get('name') or not data.get('email'):
@@ -57,14 +240,14 @@ def create_user():
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-@app.route("/users/<user_id>", methods=["GET"])
+@api.route("/users/<user_id>", methods=["GET"])
 def get_user(user_id):
-    user = User.find_by_id(user_id)
+    user = User.find_by_id(user_id, fields_arg("User"))
     if not user:
         return jsonify({"error": "User not found"}), 404
     return jsonify(node_to_dict(user))
 
-@app.route("/users/<user_id>", methods=["PUT"])
+@api.route("/users/<user_id>", methods=["PUT"])
 def update_user(user_id):
     data = request.json
     if not data:
@@ -79,35 +262,41 @@ def update_user(user_id):
                                   name=data.get('name'), 
                                   email=data.get('email'))
         return jsonify(node_to_dict(updated_user))
+    except ValueError as ve:
+        return jsonify({"error": str(ve)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-@app.route("/users/<user_id>", methods=["DELETE"])
+@api.route("/users/<user_id>", methods=["DELETE"])
 def delete_user(user_id):
     user = User.find_by_id(user_id)
     if not user:
         return jsonify({"error": "User not found"}), 404
     
     try:
-        User.delete(user_id)
+        # Les relations d'un supernœud sont supprimées par lots
+        User.delete(user_id, paged=is_supernode(user))
         return jsonify({"message": "User deleted successfully"})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 # Friend routes
-@app.route("/users/<user_id>/friends", methods=["GET"])
+@api.route("/users/<user_id>/friends", methods=["GET"])
 def get_friends(user_id):
+    fields = fields_arg("User")
     user = User.find_by_id(user_id)
     if not user:
         return jsonify({"error": "User not found"}), 404
     
     try:
-        friends = User.get_friends(user_id)
+        # ?limit=100&after=<id> : page suivante, triée par id (MAX_RESULTS au plus)
+        friends = User.get_friends(user_id, limit=limit_arg("limit", MAX_RESULTS),
+                                   after=request.args.get("after"), fields=fields)
         return jsonify([node_to_dict(friend) for friend in friends])
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-@app.route("/users/<user_id>/friends", methods=["POST"])
+@api.route("/users/<user_id>/friends", methods=["POST"])
 def add_friend(user_id):
     data = request.json
     if not data or not data.get('friend_id'):
@@ -118,8 +307,7 @@ def add_friend(user_id):
     if user_id == friend_id:
         return jsonify({"error": "Cannot add yourself as a friend"}), 400
     
-    user = User.find_by_id(user_id)
-    friend = User.find_by_id(friend_id)
+    user, friend = find_by_ids(("User", user_id), ("User", friend_id))
     
     if not user:
         return jsonify({"error": "User not found"}), 404
@@ -132,10 +320,9 @@ def add_friend(user_id):
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-@app.route("/users/<user_id>/friends/<friend_id>", methods=["DELETE"])
+@api.route("/users/<user_id>/friends/<friend_id>", methods=["DELETE"])
 def remove_friend(user_id, friend_id):
-    user = User.find_by_id(user_id)
-    friend = User.find_by_id(friend_id)
+    user, friend = find_by_ids(("User", user_id), ("User", friend_id))
     
     if not user:
         return jsonify({"error": "User not found"}), 404
@@ -148,10 +335,9 @@ def remove_friend(user_id, friend_id):
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-@app.route("/users/<user_id>/friends/<friend_id>", methods=["GET"])
+@api.route("/users/<user_id>/friends/<friend_id>", methods=["GET"])
 def check_friendship(user_id, friend_id):
-    user = User.find_by_id(user_id)
-    friend = User.find_by_id(friend_id)
+    user, friend = find_by_ids(("User", user_id), ("User", friend_id))
     
     if not user:
         return jsonify({"error": "User not found"}), 404
@@ -164,10 +350,10 @@ def check_friendship(user_id, friend_id):
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-@app.route("/users/<user_id>/mutual-friends/<other_id>", methods=["GET"])
+@api.route("/users/<user_id>/mutual-friends/<other_id>", methods=["GET"])
 def get_mutual_friends(user_id, other_id):
-    user = User.find_by_id(user_id)
-    other = User.find_by_id(other_id)
+    fields = fields_arg("User")
+    user, other = find_by_ids(("User", user_id), ("User", other_id))
     
     if not user:
         return jsonify({"error": "User not found"}), 404
@@ -175,37 +361,104 @@ def get_mutual_friends(user_id, other_id):
         return jsonify({"error": "Other user not found"}), 404
     
     try:
-        mutual_friends = User.get_mutual_friends(user_id, other_id)
+        mutual_friends = User.get_mutual_friends(user_id, other_id,
+                                                 limit=limit_arg("limit", MAX_RESULTS),
+                                                 fields=fields)
         return jsonify([node_to_dict(friend) for friend in mutual_friends])
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@api.route("/users/<user_id>/relations:check", methods=["POST"])
+def check_relations(user_id):
+    # {"posts": [...], "comments": [...], "users": [...]} : likes et amitiés
+    # de l'utilisateur pour chaque id, en une seule requête
+    error = {"error": "posts, comments and users must be lists of ids"}
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify(error), 400
+    ids = {key: data.get(key) or [] for key in ("posts", "comments", "users")}
+    if not all(isinstance(value, list) and all(isinstance(item, str) for item in value)
+               for value in ids.values()):
+        return jsonify(error), 400
+    if sum(len(value) for value in ids.values()) > MAX_RESULTS:
+        return jsonify({"error": f"At most {MAX_RESULTS} ids can be checked at once"}), 400
+    
+    try:
+        relations = User.check_relations(user_id, ids["posts"], ids["comments"], ids["users"])
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+    if relations is None:
+        return jsonify({"error": "User not found"}), 404
+    return jsonify(relations)
+
+@api.route("/users/<user_id>/community", methods=["GET"])
+def get_user_community(user_id):
+    try:
+        community = User.get_community(user_id)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+    if community is None:
+        return jsonify({"error": "User not found"}), 404
+    return jsonify(community)
+
 # Post routes
-@app.route("/posts", methods=["GET"])
+@api.route("/posts", methods=["GET"])
 def get_posts():
-    posts = Post.find_all()
+    if "ids" in request.args:
+        return batch_get("Post", ids_arg())
+    # ?limit=20&before=<id> : les posts les plus récents, page par page
+    limit = limit_arg()
+    try:
+        window = time_window_args()
+    except ValueError:
+        return jsonify({"error": TIME_WINDOW_ERROR}), 400
+    posts = Post.find_all(limit=limit, before=request.args.get("before"),
+                          fields=fields_arg("Post"), **window)
     return jsonify([node_to_dict(post) for post in posts])
 
-@app.route("/posts/<post_id>", methods=["GET"])
+@api.route("/posts:batchGet", methods=["POST"])
+def batch_get_posts():
+    return batch_get("Post", ids_body())
+
+@api.route("/posts/<post_id>", methods=["GET"])
 def get_post(post_id):
-    post = Post.find_by_id(post_id)
+    # ?include=author,comments,comment_count,like_count,viewer_liked&viewer=<id>
+    # &comments_limit=20 : tout l'écran d'un post en une seule requête Cypher
+    include = [name for name in request.args.get("include", "").split(",") if name]
+    fields = fields_arg("Post")
+    if not include:
+        post = Post.find_by_id(post_id, fields)
+    else:
+        unknown = [name for name in include if name not in queries.POST_INCLUDES]
+        if unknown:
+            return jsonify({"error": f"Unknown include: {', '.join(unknown)}"}), 400
+        viewer = request.args.get("viewer")
+        if "viewer_liked" in include and not viewer:
+            return jsonify({"error": "viewer is required for viewer_liked"}), 400
+        post = Post.find_detail(post_id, include, viewer, limit_arg("comments_limit", 20), fields)
     if not post:
         return jsonify({"error": "Post not found"}), 404
     return jsonify(node_to_dict(post))
 
-@app.route("/users/<user_id>/posts", methods=["GET"])
+@api.route("/users/<user_id>/posts", methods=["GET"])
 def get_user_posts(user_id):
+    fields = fields_arg("Post")
+    try:
+        window = time_window_args()
+    except ValueError:
+        return jsonify({"error": TIME_WINDOW_ERROR}), 400
+    
     user = User.find_by_id(user_id)
     if not user:
         return jsonify({"error": "User not found"}), 404
     
     try:
-        posts = Post.find_by_user(user_id)
+        posts = Post.find_by_user(user_id, fields=fields, **window)
         return jsonify([node_to_dict(post) for post in posts])
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-@app.route("/users/<user_id>/posts", methods=["POST"])
+@api.route("/users/<user_id>/posts", methods=["POST"])
 def create_post(user_id):
     data = request.json
     if not data or not data.get('title') or not data.get('content'):
@@ -223,7 +476,7 @@ def create_post(user_id):
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-@app.route("/posts/<post_id>", methods=["PUT"])
+@api.route("/posts/<post_id>", methods=["PUT"])
 def update_post(post_id):
     data = request.json
     if not data:
@@ -241,7 +494,7 @@ def update_post(post_id):
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-@app.route("/posts/<post_id>", methods=["DELETE"])
+@api.route("/posts/<post_id>", methods=["DELETE"])
 def delete_post(post_id):
     post = Post.find_by_id(post_id)
     if not post:
@@ -253,7 +506,7 @@ def delete_post(post_id):
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-@app.route("/posts/<post_id>/like", methods=["POST"])
+@api.route("/posts/<post_id>/like", methods=["POST"])
 def like_post(post_id):
     data = request.json
     if not data or not data.get('user_id'):
@@ -261,8 +514,7 @@ def like_post(post_id):
     
     user_id = data['user_id']
     
-    post = Post.find_by_id(post_id)
-    user = User.find_by_id(user_id)
+    post, user = find_by_ids(("Post", post_id), ("User", user_id))
     
     if not post:
         return jsonify({"error": "Post not found"}), 404
@@ -275,7 +527,7 @@ def like_post(post_id):
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-@app.route("/posts/<post_id>/like", methods=["DELETE"])
+@api.route("/posts/<post_id>/like", methods=["DELETE"])
 def unlike_post(post_id):
     data = request.json
     if not data or not data.get('user_id'):
@@ -283,8 +535,7 @@ def unlike_post(post_id):
     
     user_id = data['user_id']
     
-    post = Post.find_by_id(post_id)
-    user = User.find_by_id(user_id)
+    post, user = find_by_ids(("Post", post_id), ("User", user_id))
     
     if not post:
         return jsonify({"error": "Post not found"}), 404
@@ -298,19 +549,29 @@ def unlike_post(post_id):
         return jsonify({"error": str(e)}), 500
 
 # Comment routes
-@app.route("/comments", methods=["GET"])
+@api.route("/comments", methods=["GET"])
 def get_comments():
-    comments = Comment.find_all()
+    if "ids" in request.args:
+        return batch_get("Comment", ids_arg())
+    try:
+        window = time_window_args()
+    except ValueError:
+        return jsonify({"error": TIME_WINDOW_ERROR}), 400
+    comments = Comment.find_all(fields=fields_arg("Comment"), **window)
     return jsonify([node_to_dict(comment) for comment in comments])
 
-@app.route("/comments/<comment_id>", methods=["GET"])
+@api.route("/comments:batchGet", methods=["POST"])
+def batch_get_comments():
+    return batch_get("Comment", ids_body())
+
+@api.route("/comments/<comment_id>", methods=["GET"])
 def get_comment(comment_id):
-    comment = Comment.find_by_id(comment_id)
+    comment = Comment.find_by_id(comment_id, fields_arg("Comment"))
     if not comment:
         return jsonify({"error": "Comment not found"}), 404
     return jsonify(node_to_dict(comment))
 
-@app.route("/comments/<comment_id>", methods=["PUT"])
+@api.route("/comments/<comment_id>", methods=["PUT"])
 def update_comment(comment_id):
     data = request.json
     if not data or not data.get('content'):
@@ -326,7 +587,7 @@ def update_comment(comment_id):
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-@app.route("/comments/<comment_id>", methods=["DELETE"])
+@api.route("/comments/<comment_id>", methods=["DELETE"])
 def delete_comment(comment_id):
     comment = Comment.find_by_id(comment_id)
     if not comment:
@@ -338,29 +599,34 @@ def delete_comment(comment_id):
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-@app.route("/posts/<post_id>/comments", methods=["GET"])
+@api.route("/posts/<post_id>/comments", methods=["GET"])
 def get_post_comments(post_id):
+    fields = fields_arg("Comment")
+    try:
+        window = time_window_args()
+    except ValueError:
+        return jsonify({"error": TIME_WINDOW_ERROR}), 400
+    
     post = Post.find_by_id(post_id)
     if not post:
         return jsonify({"error": "Post not found"}), 404
     
     try:
-        comments = Comment.find_by_post(post_id)
+        comments = Comment.find_by_post(post_id, fields=fields, **window)
         return jsonify([node_to_dict(comment) for comment in comments])
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-@app.route("/posts/<post_id>/comments", methods=["POST"])
+@api.route("/posts/<post_id>/comments", methods=["POST"])
 def create_comment(post_id):
     data = request.json
     if not data or not data.get('content') or not data.get('user_id'):
         return jsonify({"error": "Content and user_id required"}), 400
     
-    post = Post.find_by_id(post_id)
+    post, user = find_by_ids(("Post", post_id), ("User", data['user_id']))
     if not post:
         return jsonify({"error": "Post not found"}), 404
     
-    user = User.find_by_id(data['user_id'])
     if not user:
         return jsonify({"error": "User not found"}), 404
     
@@ -373,7 +639,7 @@ def create_comment(post_id):
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-@app.route("/comments/<comment_id>/like", methods=["POST"])
+@api.route("/comments/<comment_id>/like", methods=["POST"])
 def like_comment(comment_id):
     data = request.json
     if not data or not data.get('user_id'):
@@ -381,8 +647,7 @@ def like_comment(comment_id):
     
     user_id = data['user_id']
     
-    comment = Comment.find_by_id(comment_id)
-    user = User.find_by_id(user_id)
+    comment, user = find_by_ids(("Comment", comment_id), ("User", user_id))
     
     if not comment:
         return jsonify({"error": "Comment not found"}), 404
@@ -395,7 +660,7 @@ def like_comment(comment_id):
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-@app.route("/comments/<comment_id>/like", methods=["DELETE"])
+@api.route("/comments/<comment_id>/like", methods=["DELETE"])
 def unlike_comment(comment_id):
     data = request.json
     if not data or not data.get('user_id'):
@@ -403,8 +668,7 @@ def unlike_comment(comment_id):
     
     user_id = data['user_id']
     
-    comment = Comment.find_by_id(comment_id)
-    user = User.find_by_id(user_id)
+    comment, user = find_by_ids(("Comment", comment_id), ("User", user_id))
     
     if not comment:
         return jsonify({"error": "Comment not found"}), 404
@@ -417,3 +681,31 @@ def unlike_comment(comment_id):
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+
+# Admin routes
+@api.route("/admin/queries", methods=["GET"])
+def get_query_stats():
+    return jsonify(querystats.snapshot())
+
+@api.route("/admin/endpoints", methods=["GET"])
+def get_endpoint_stats():
+    return jsonify(httpstats.snapshot())
+
+@api.route("/admin/singleflight", methods=["GET"])
+def get_singleflight_stats():
+    # Lectures identiques simultanées regroupées, par clé (méthode et arguments)
+    return jsonify(singleflight.snapshot())
+
+@api.route("/admin/existence", methods=["GET"])
+def get_existence_report():
+    # Filtre de Bloom (taille, taux de faux positifs) et cache négatif
+    return jsonify(existence.report())
+
+@api.route("/admin/warmup", methods=["GET"])
+def get_warmup_report():
+    return jsonify(current_app.extensions.get("warmup_report", {}))
+
+@api.route("/admin/supernodes", methods=["GET"])
+def get_supernodes():
+    # Utilisateurs de plus haut degré (friend_count, post_count)
+    return jsonify(top_degree(limit_arg("limit", 20)))
@@ -0,0 +1,115 @@
+import click
+from flask import Blueprint
+
+from analytics import compute_communities, compute_pagerank, relabel_stale_communities, PAGE_SIZE
+from models import (apply_schema, bench_friends, bench_ids, bench_save_many, migrate_created_at,
+                    migrate_friendships, migrate_ids, update_degree_counts, BATCH_SIZE)
+
+# Commandes de maintenance : `flask --app app <commande>`
+commands = Blueprint("commands", __name__, cli_group=None)
+
+@commands.cli.command("init-schema")
+def init_schema():
+    """Create the Neo4j constraints and indexes."""
+    apply_schema()
+    click.echo("Schema applied")
+
+@commands.cli.command("migrate-ids")
+@click.option("--batch-size", default=BATCH_SIZE, show_default=True)
+def migrate_ids_command(batch_size):
+    """Replace UUID4 ids with time-ordered ULIDs (old id kept in legacy_id)."""
+    for label, count in migrate_ids(batch_size).items():
+        click.echo(f"{label}: {count} ids migrated")
+
+@commands.cli.command("bench-ids")
+@click.option("--pages", default=20, show_default=True, help="pages of latest posts walked")
+@click.option("--limit", default=100, show_default=True, help="posts per page")
+@click.option("--repeat", default=3, show_default=True)
+def bench_ids_command(pages, limit, repeat):
+    """Report id key sizes and time latest-post scans by id and by created_at."""
+    report = bench_ids(pages, limit, repeat)
+    for label, sizes in report["sizes"].items():
+        mean = sizes["id_bytes"] / sizes["nodes"] if sizes["nodes"] else 0
+        click.echo(f"{label}: {sizes['nodes']} ids, {sizes['legacy']} re-keyed, "
+                   f"{sizes['id_bytes']} bytes of keys ({mean:.1f} per id)")
+    click.echo(f"{pages} pages of {limit} posts:")
+    for name in ("by_id", "by_created_at"):
+        walk = report[name]
+        order = "index order" if walk["index_ordered"] else "sorted"
+        click.echo(f"  {name}: {walk['ms']:.1f} ms ({order}: {' <- '.join(walk['operators'])})")
+
+@commands.cli.command("migrate-created-at")
+@click.option("--batch-size", default=BATCH_SIZE, show_default=True)
+def migrate_created_at_command(batch_size):
+    """Convert float created_at timestamps to native DateTime values."""
+    for label, count in migrate_created_at(batch_size).items():
+        click.echo(f"{label}: {count} dates converted")
+
+@commands.cli.command("degree-counts")
+@click.option("--batch-size", default=BATCH_SIZE, show_default=True)
+def degree_counts_command(batch_size):
+    """Recompute the friend_count and post_count of every user."""
+    click.echo(f"{update_degree_counts(batch_size)} users updated")
+
+@commands.cli.command("migrate-friendships")
+@click.option("--batch-size", default=BATCH_SIZE, show_default=True)
+def migrate_friendships_command(batch_size):
+    """Store each friendship as one relationship, from the lower id to the higher."""
+    report = migrate_friendships(batch_size)
+    click.echo(f"{report['pairs']} friendships fixed, {report['users']} users recounted")
+
+@commands.cli.command("bench-friends")
+@click.option("--users", default=20, show_default=True, help="users with the most friends sampled")
+@click.option("--repeat", default=5, show_default=True)
+def bench_friends_command(users, repeat):
+    """Count FRIENDS_WITH relationships and time the friendship reads."""
+    report = bench_friends(users, repeat)
+    click.echo(f"{report['relationships']} relationships for {report['pairs']} friendships "
+               f"({report['duplicates']} duplicates)")
+    for name in ("get_friends_ms", "mutual_friends_ms"):
+        if report[name] is not None:
+            click.echo(f"  {name[:-3]}: {report[name]:.2f} ms on average over {report['users']} users")
+
+@commands.cli.command("bench-save-many")
+@click.option("--rows", default=10000, show_default=True, help="users (and posts) written per run")
+@click.option("--batch-sizes", default="100,1000,5000", show_default=True,
+              help="comma-separated batch sizes compared")
+def bench_save_many_command(rows, batch_sizes):
+    """Time batched user and post inserts (rows/s) against the batch size."""
+    sizes = [int(size) for size in batch_sizes.split(",")]
+    for report in bench_save_many(rows, sizes):
+        click.echo(f"batch {report['batch_size']:5d}: "
+                   f"{report['users_per_s']:9.0f} users/s, {report['posts_per_s']:9.0f} posts/s")
+
+@commands.cli.command("pagerank")
+@click.option("--page-size", default=PAGE_SIZE, show_default=True, help="users read per query")
+@click.option("--batch-size", default=BATCH_SIZE, show_default=True, help="scores written per transaction")
+@click.option("--damping", default=0.85, show_default=True)
+@click.option("--max-iterations", default=50, show_default=True)
+@click.option("--tolerance", default=1e-6, show_default=True)
+def pagerank_command(page_size, batch_size, damping, max_iterations, tolerance):
+    """Score users by influence (PageRank over friendships and likes)."""
+    report = compute_pagerank(page_size, batch_size, damping, max_iterations,
+                              tolerance, progress=click.echo)
+    click.echo(f"{report['users']} users, {report['edges']} edges scored in "
+               f"{report['duration_s']:.1f} s (peak {report['peak_memory_mb']:.0f} MB)")
+    for entry in report["top"]:
+        click.echo(f"  {entry['id']}  {entry['pagerank']:.6f}")
+
+@commands.cli.command("communities")
+@click.option("--page-size", default=PAGE_SIZE, show_default=True, help="users read per query")
+@click.option("--batch-size", default=BATCH_SIZE, show_default=True, help="users written per transaction")
+@click.option("--max-iterations", default=20, show_default=True)
+@click.option("--workers", type=int, help="worker processes (default: CPU count)")
+@click.option("--incremental", is_flag=True,
+              help="only re-label users whose friendships changed since the last run")
+def communities_command(page_size, batch_size, max_iterations, workers, incremental):
+    """Group users into communities (label propagation over friendships)."""
+    if incremental:
+        count = relabel_stale_communities(batch_size, progress=click.echo)
+        click.echo(f"{count} users re-labelled")
+        return
+    report = compute_communities(page_size, batch_size, max_iterations, workers,
+                                 progress=click.echo)
+    click.echo(f"{report['users']} users in {report['communities']} communities, "
+               f"{report['duration_s']:.1f} s (peak {report['peak_memory_mb']:.0f} MB)")
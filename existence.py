@@ -0,0 +1,152 @@
+"""
+Filtre de Bloom des ids (User, Post, Comment) et des emails existants, et
+cache négatif de courte durée.
+
+Le filtre répond « absent à coup sûr » ou « peut-être présent » : une
+recherche d'un id absent du filtre est donc résolue sans requête Neo4j. Les
+bits sont dans une mémoire partagée (mmap anonyme) : construit par le
+processus maître avant le fork, le filtre est commun à tous les workers, qui
+voient les ajouts des autres. On n'en retire jamais rien : un id supprimé
+reste « peut-être présent » et passe par Neo4j.
+
+Les écritures faites hors de l'application (autre serveur, script) ne sont
+pas vues : désactivez alors le filtre (FLASK_EXISTENCE_FILTER=false).
+"""
+from threading import Lock
+import hashlib
+import math
+import mmap
+import multiprocessing
+import os
+import time
+
+# Taux de faux positifs visé à la capacité prévue
+ERROR_RATE = 0.01
+
+# Durée de vie des absences confirmées par Neo4j, en secondes
+NEGATIVE_TTL = 2.0
+NEGATIVE_MAX_SIZE = 100000
+
+class BloomFilter:
+    """
+    A Bloom filter whose bits live in shared memory, so that forked
+    processes share it.
+    """
+    def __init__(self, capacity, error_rate=ERROR_RATE):
+        capacity = max(capacity, 1)
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = mmap.mmap(-1, (self.size + 7) // 8)
+        # Verrou commun aux processus : deux ajouts ne se perdent pas un bit
+        self.lock = multiprocessing.Lock()
+
+    def _positions(self, key):
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, key):
+        positions = self._positions(key)
+        with self.lock:
+            for position in positions:
+                self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key):
+        bits = self.bits
+        return all(bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+    def report(self):
+        set_bits = int.from_bytes(self.bits, "little").bit_count()
+        fill = set_bits / self.size
+        return {"bits": self.size, "hash_functions": self.hashes,
+                "memory_bytes": len(self.bits), "fill_ratio": fill,
+                # Estimations d'après la proportion de bits à 1
+                "estimated_keys": round(-self.size / self.hashes * math.log(1 - fill))
+                                  if fill < 1 else None,
+                "estimated_fp_rate": fill ** self.hashes}
+
+_filter = None
+_lock = Lock()
+_misses = {}
+_stats = {"lookups": 0, "filtered": 0, "cached": 0, "false_positives": 0}
+_build = {}
+
+def _key(label, value):
+    return f"{label}:{value}"
+
+def install(bloom, duration_ms):
+    """
+    Start answering lookups with a fully built filter.
+    """
+    global _filter
+    _build.update(duration_ms=duration_ms, pid=os.getpid())
+    _filter = bloom
+
+def ready():
+    return _filter is not None
+
+def add(label, value):
+    """
+    Record a new id (label "User", "Post" or "Comment") or email (label "email").
+    """
+    key = _key(label, value)
+    if _filter is not None:
+        _filter.add(key)
+    with _lock:
+        _misses.pop(key, None)
+
+def known_missing(label, value):
+    """
+    Tell whether a lookup can be answered "not found" without Neo4j: the
+    filter rules the key out, or Neo4j did not find it a moment ago.
+    """
+    key = _key(label, value)
+    with _lock:
+        _stats["lookups"] += 1
+        if _filter is not None and key not in _filter:
+            _stats["filtered"] += 1
+            return True
+        expiry = _misses.get(key)
+        if expiry is not None and expiry > time.monotonic():
+            _stats["cached"] += 1
+            return True
+    return False
+
+def missed(label, value):
+    """
+    Record that Neo4j did not find a key that the filter let through.
+    """
+    key = _key(label, value)
+    now = time.monotonic()
+    with _lock:
+        if _filter is not None:
+            _stats["false_positives"] += 1
+        if len(_misses) >= NEGATIVE_MAX_SIZE:
+            for stale in [k for k, expiry in _misses.items() if expiry <= now]:
+                del _misses[stale]
+            if len(_misses) >= NEGATIVE_MAX_SIZE:
+                _misses.clear()
+        _misses[key] = now + NEGATIVE_TTL
+
+def might_exist(label, value):
+    """
+    Ask the filter only (no negative cache), e.g. before checking that an
+    email is free: False means certainly absent.
+    """
+    return _filter is None or _key(label, value) in _filter
+
+def report():
+    """
+    Return the filter's size and estimated false-positive rate, and the
+    lookup counters of this process.
+    """
+    with _lock:
+        stats = dict(_stats)
+        stats["negative_cache_size"] = len(_misses)
+    absent = stats["false_positives"] + stats["filtered"]
+    # Part des clés absentes que le filtre a laissé passer
+    stats["observed_fp_rate"] = stats["false_positives"] / absent if absent else None
+    stats["filter"] = _filter.report() if _filter is not None else None
+    stats["build"] = dict(_build)
+    return stats
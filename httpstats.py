@@ -0,0 +1,40 @@
+from threading import Lock
+
+# Statistiques cumulées par route et par mode de projection (?fields=)
+_lock = Lock()
+_stats = {}
+
+def record(endpoint, fields, elapsed, size):
+    """
+    Add one response to its endpoint's statistics.
+    :param endpoint: The method and URL rule, e.g. "GET /posts".
+    :param fields: Whether the request used ?fields=.
+    :param elapsed: The time spent serving the request, in seconds.
+    :param size: The response body size, in bytes.
+    """
+    key = (endpoint, fields)
+    with _lock:
+        entry = _stats.get(key)
+        if entry is None:
+            entry = _stats[key] = {"endpoint": endpoint, "fields": fields, "calls": 0,
+                                   "total_ms": 0.0, "max_ms": 0.0, "bytes": 0}
+        elapsed_ms = elapsed * 1000
+        entry["calls"] += 1
+        entry["total_ms"] += elapsed_ms
+        entry["max_ms"] = max(entry["max_ms"], elapsed_ms)
+        entry["bytes"] += size
+
+def snapshot():
+    """
+    Return the statistics of every endpoint, sorted by bytes sent.
+    """
+    with _lock:
+        entries = [dict(entry) for entry in _stats.values()]
+    for entry in entries:
+        entry["mean_ms"] = entry["total_ms"] / entry["calls"]
+        entry["mean_bytes"] = entry["bytes"] / entry["calls"]
+    return sorted(entries, key=lambda entry: entry["bytes"], reverse=True)
+
+def reset():
+    with _lock:
+        _stats.clear()
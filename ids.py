@@ -0,0 +1,77 @@
+from threading import Lock
+import os
+import time
+import uuid
+
+# Alphabet base32 de Crockford : l'ordre des caractères suit l'ordre ASCII,
+# donc l'ordre lexicographique des identifiants suit l'ordre chronologique
+_CROCKFORD = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+
+_lock = Lock()
+_last_ms = 0
+_last_random = 0
+
+def _encode(value, length):
+    chars = []
+    for _ in range(length):
+        chars.append(_CROCKFORD[value & 31])
+        value >>= 5
+    return "".join(reversed(chars))
+
+def ulid(timestamp=None):
+    """
+    Generate a ULID: 26 characters, 48 bits of milliseconds then 80 random bits.
+    Ids generated by this process are strictly increasing, even within the
+    same millisecond.
+    :param timestamp: Optional time in seconds, e.g. to re-key existing nodes.
+    :return: The id as a string.
+    """
+    global _last_ms, _last_random
+    if timestamp is not None:
+        return _encode((int(timestamp * 1000) << 80) | int.from_bytes(os.urandom(10), "big"), 26)
+    with _lock:
+        ms = time.time_ns() // 1_000_000
+        if ms <= _last_ms:
+            # Même milliseconde (ou horloge qui recule) : on incrémente
+            ms, random = _last_ms, _last_random + 1
+        else:
+            random = int.from_bytes(os.urandom(10), "big")
+        _last_ms, _last_random = ms, random
+    return _encode((ms << 80) | random, 26)
+
+# Plus grand que tout id (ULID en majuscules, UUID4 en minuscules) : curseur
+# de la première page d'un parcours décroissant (WHERE n.id < $before)
+MAX_ID = "~"
+
+def uuid4():
+    return str(uuid.uuid4())
+
+def is_legacy(value):
+    """
+    Tell whether an id is a UUID4 from before `flask migrate-ids`, which
+    only exists as the legacy_id of a re-keyed node. Always False when new
+    ids are UUID4 themselves.
+    """
+    if _generator is uuid4 or len(value) != 36:
+        return False
+    try:
+        uuid.UUID(value)
+    except ValueError:
+        return False
+    return True
+
+# Générateurs disponibles, choisis par la variable d'environnement ID_GENERATOR
+GENERATORS = {"ulid": ulid, "uuid4": uuid4}
+
+_generator = GENERATORS[os.environ.get("ID_GENERATOR", "ulid")]
+
+def set_generator(generator):
+    """
+    Replace the id generator used for new users, posts and comments.
+    :param generator: A name from GENERATORS or a callable returning a string.
+    """
+    global _generator
+    _generator = GENERATORS[generator] if isinstance(generator, str) else generator
+
+def new_id():
+    return _generator()
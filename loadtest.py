@@ -0,0 +1,117 @@
+"""
+Mesure du débit de server.py selon le nombre de workers.
+
+Pour chaque nombre de workers demandé, lance server.py sur un port libre,
+attend qu'il réponde, envoie des requêtes GET depuis --concurrency threads
+pendant --duration secondes, puis l'arrête (SIGTERM). Affiche le débit, la
+latence médiane et au 99e centile et le nombre d'erreurs.
+
+    python loadtest.py --workers 1,2,4,8 --path "/posts?limit=20" --duration 10
+"""
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+SERVER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "server.py")
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Measure server.py throughput by worker count.")
+    parser.add_argument("--workers", default=f"1,{os.cpu_count() or 1}",
+                        help="comma-separated worker counts (default: 1 and the CPU count)")
+    parser.add_argument("--path", default="/posts?limit=20", help="URL path requested")
+    parser.add_argument("--concurrency", type=int, default=32, help="client threads")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per run")
+    parser.add_argument("--startup-timeout", type=float, default=60.0,
+                        help="seconds to wait for the server to answer")
+    return parser.parse_args(argv)
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def get(url):
+    # Renvoie la durée de la requête en secondes, ou None en cas d'erreur
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(url, timeout=30) as response:
+            response.read()
+    except (urllib.error.URLError, OSError):
+        return None
+    return time.perf_counter() - start
+
+def wait_ready(url, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if get(url) is not None:
+            return True
+        time.sleep(0.2)
+    return False
+
+def load(url, concurrency, duration):
+    """
+    Send requests from concurrency threads until duration elapses.
+    :return: The latencies of the successful requests and the error count.
+    """
+    deadline = time.monotonic() + duration
+
+    def client():
+        latencies, errors = [], 0
+        while time.monotonic() < deadline:
+            latency = get(url)
+            if latency is None:
+                errors += 1
+            else:
+                latencies.append(latency)
+        return latencies, errors
+
+    latencies, errors = [], 0
+    with ThreadPoolExecutor(concurrency) as pool:
+        for part, part_errors in pool.map(lambda _: client(), range(concurrency)):
+            latencies.extend(part)
+            errors += part_errors
+    return sorted(latencies), errors
+
+def run(workers, args):
+    """
+    Start server.py with the given number of workers and load it.
+    :return: A report with the throughput, latencies (ms) and errors.
+    """
+    port = free_port()
+    url = f"http://127.0.0.1:{port}{args.path}"
+    server = subprocess.Popen([sys.executable, SERVER, "--port", str(port),
+                               "--workers", str(workers)], stderr=subprocess.DEVNULL)
+    try:
+        if not wait_ready(url, args.startup_timeout):
+            raise RuntimeError(f"server.py with {workers} workers did not answer {url}")
+        latencies, errors = load(url, args.concurrency, args.duration)
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait()
+    count = len(latencies)
+    return {"workers": workers, "requests": count, "errors": errors,
+            "requests_per_s": count / args.duration,
+            "p50_ms": latencies[count // 2] * 1000 if count else None,
+            "p99_ms": latencies[min(count - 1, count * 99 // 100)] * 1000 if count else None}
+
+def main(argv=None):
+    args = parse_args(argv)
+    baseline = None
+    for workers in [int(value) for value in args.workers.split(",")]:
+        report = run(workers, args)
+        baseline = baseline or report["requests_per_s"]
+        scaling = report["requests_per_s"] / baseline if baseline else 0
+        latency = (f"p50 {report['p50_ms']:.1f} ms, p99 {report['p99_ms']:.1f} ms"
+                   if report["requests"] else "no successful request")
+        print(f"{workers:3d} workers: {report['requests_per_s']:8.1f} req/s (x{scaling:.2f}), "
+              f"{latency}, {report['errors']} errors")
+
+if __name__ == "__main__":
+    main()
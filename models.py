@@ -1,9 +1,387 @@
-from py2neo import Graph, Node, Relationship
 from datetime import datetime
-import uuid
+from threading import Lock
+import os
+import time
 
-# Connect to Neo4j database
-graph = Graph("bolt://localhost:7687", auth=("neo4j", "password"))
+from pytz import utc
+
+from ids import is_legacy, new_id, ulid, MAX_ID
+from singleflight import coalesced
+import existence
+import queries
+import querystats
+
+# Connexion à Neo4j, créée au premier usage et propre à chaque processus
+_graph = None
+_graph_pid = None
+_graph_lock = Lock()
+
+def get_graph():
+    """
+    Return the Neo4j Graph of the current process, connecting on first use.
+    A forked worker gets its own Graph instead of the sockets of its parent.
+    The URI (bolt:// or http://) and credentials come from NEO4J_URI,
+    NEO4J_USER and NEO4J_PASSWORD.
+    :return: A py2neo Graph object.
+    """
+    global _graph, _graph_pid
+    if _graph is None or _graph_pid != os.getpid():
+        with _graph_lock:
+            if _graph is None or _graph_pid != os.getpid():
+                # py2neo est lourd à importer : on ne le charge qu'ici
+                from py2neo import Graph
+                _graph = Graph(os.environ.get("NEO4J_URI", "bolt://localhost:7687"),
+                               auth=(os.environ.get("NEO4J_USER", "neo4j"),
+                                     os.environ.get("NEO4J_PASSWORD", "password")))
+                _graph_pid = os.getpid()
+    return _graph
+
+# Nombre de lignes envoyées par requête UNWIND lors des insertions en masse
+BATCH_SIZE = 1000
+
+# Au-delà de ce nombre d'amis et de posts, un utilisateur est un supernœud :
+# ses relations sont supprimées par lots
+SUPERNODE_DEGREE = 10000
+
+# Nombre maximal de résultats des listes d'amis
+MAX_RESULTS = 1000
+
+# Code d'erreur Neo4j d'une contrainte d'unicité violée
+CONSTRAINT_FAILED = "Neo.ClientError.Schema.ConstraintValidationFailed"
+
+# Bornes par défaut des fenêtres de temps (since/until)
+EARLIEST = datetime(1, 1, 1, tzinfo=utc)
+LATEST = datetime(9999, 12, 31, tzinfo=utc)
+
+def close_graph():
+    """
+    Close the Neo4j connections opened by the current process, if any.
+    """
+    global _graph
+    with _graph_lock:
+        if _graph is not None and _graph_pid == os.getpid():
+            _graph.service.connector.close()
+        _graph = None
+
+def check_email_constraint(error, email):
+    """
+    Turn a violation of the user_email constraint (an email taken, maybe by
+    another process) into the ValueError raised for a taken email. Other
+    errors are left to the caller.
+    """
+    if getattr(error, "code", None) == CONSTRAINT_FAILED:
+        raise ValueError(f"An account with email {email} already exists.") from error
+
+def run(query, **params):
+    """
+    Run a Cypher query and record its execution statistics.
+    :param query: The Cypher query.
+    :param params: The query parameters.
+    :return: A py2neo Cursor.
+    """
+    start = time.perf_counter()
+    cursor = get_graph().run(query, **params)
+    querystats.record(query, time.perf_counter() - start, counters=cursor.stats())
+    return cursor
+
+def evaluate(query, **params):
+    """
+    Run a Cypher query, record its statistics and return its first value.
+    :param query: The Cypher query.
+    :param params: The query parameters.
+    :return: The first value of the first record, or None.
+    """
+    start = time.perf_counter()
+    cursor = get_graph().run(query, **params)
+    value = cursor.evaluate()
+    rows = len(value) if isinstance(value, list) else int(value is not None)
+    querystats.record(query, time.perf_counter() - start, rows, cursor.stats())
+    return value
+
+def warmup():
+    """
+    Run EXPLAIN on every registered statement with its example parameters,
+    so that the server plan cache is hot and syntax or schema errors surface
+    before serving traffic.
+    :return: A report with the statement count, the duration in milliseconds
+             and the error message of each failed statement, by name.
+    """
+    start = time.perf_counter()
+    graph = get_graph()
+    failures = {}
+    for name, cypher in list(queries.STATEMENTS.items()):
+        try:
+            graph.run("EXPLAIN " + cypher, **queries.PARAMETERS[name])
+        except Exception as e:
+            failures[name] = str(e)
+    return {"statements": len(queries.STATEMENTS),
+            "duration_ms": (time.perf_counter() - start) * 1000,
+            "failures": failures}
+
+def migrate_ids(batch_size=BATCH_SIZE):
+    """
+    Replace the UUID4 ids of existing nodes with ULIDs built from created_at,
+    in batches. The previous id is kept in the legacy_id property.
+    :param batch_size: The number of nodes read per query.
+    :return: The number of re-keyed nodes, by label.
+    """
+    migrated = {}
+    for label, query in queries.LEGACY_IDS.items():
+        migrated[label], after = 0, ""
+        while True:
+            page = evaluate(query, after=after, limit=batch_size)
+            if not page["count"]:
+                break
+            after, rows = page["last_id"], page["rows"]
+            if not rows:
+                continue
+            new_ids = [ulid(to_timestamp(created_at)) for _, created_at in rows]
+            for new_id in new_ids:
+                existence.add(label, new_id)
+            run(queries.REKEY[label], id=[old_id for old_id, _ in rows], new_id=new_ids)
+            migrated[label] += len(rows)
+    return migrated
+
+def current_id(label, node_id):
+    """
+    Map an id from before `flask migrate-ids` to the node's current id.
+    :param label: "User", "Post" or "Comment".
+    :param node_id: Any id.
+    :return: The current id, or node_id itself if it is not a re-keyed UUID4.
+    """
+    if not is_legacy(node_id):
+        return node_id
+    return evaluate(queries.LEGACY_REMAP[label], legacy_id=node_id) or node_id
+
+def bench_ids(pages=20, limit=100, repeat=3):
+    """
+    Measure the id keys (count, re-keyed nodes, total size) and time a
+    walk through the latest posts, page by page, by id then by created_at.
+    The plan of each walk comes from EXPLAIN: an index-ordered walk has no
+    Sort or Top operator.
+    :param pages: The number of pages walked.
+    :param limit: The number of posts per page.
+    :param repeat: The number of walks of each kind.
+    :return: The sizes by label, and for each walk ("by_id", "by_created_at")
+             its mean duration (ms) and plan operators.
+    """
+    report = {"sizes": {label: dict(evaluate(query)) for label, query in queries.ID_SIZES.items()}}
+    walks = (("by_id", queries.POST_FIND_LATEST, "id", MAX_ID),
+             ("by_created_at", queries.POST_LATEST_BY_CREATED_AT, "created_at", LATEST))
+    for name, query, key, first in walks:
+        plan = get_graph().run("EXPLAIN " + query, limit=limit, before=first).plan()
+        operators = plan_operators(plan)
+        durations = []
+        for _ in range(repeat):
+            start, before = time.perf_counter(), first
+            for _ in range(pages):
+                posts = evaluate(query, limit=limit, before=before)
+                if not posts:
+                    break
+                before = posts[-1][key]
+            durations.append((time.perf_counter() - start) * 1000)
+        report[name] = {"ms": sum(durations) / len(durations), "operators": operators,
+                        "index_ordered": not SORT_OPERATORS.intersection(operators)}
+    return report
+
+# Opérateurs d'un plan qui trient les lignes au lieu de suivre l'index
+SORT_OPERATORS = {"Sort", "Top", "PartialSort", "PartialTop"}
+
+def plan_operators(plan):
+    """
+    Flatten an EXPLAIN plan, as returned by Cursor.plan(), into the list of
+    its operator names, root first.
+    """
+    if not plan:
+        return []
+    operators = [plan.get("operatorType", "").split("@")[0]]
+    for child in plan.get("children", []):
+        operators.extend(plan_operators(child))
+    return operators
+
+def migrate_created_at(batch_size=BATCH_SIZE):
+    """
+    Convert the float created_at of existing nodes (seconds since the epoch)
+    to native DateTime values, in batches.
+    :param batch_size: The number of nodes read per query.
+    :return: The number of converted nodes, by label.
+    """
+    migrated = {}
+    for label, query in queries.FLOAT_CREATED_AT.items():
+        migrated[label] = 0
+        after = ""
+        while True:
+            page = evaluate(query, after=after, limit=batch_size)
+            if not page["count"]:
+                break
+            migrated[label] += page["converted"]
+            after = page["last_id"]
+    return migrated
+
+def update_degree_counts(batch_size=BATCH_SIZE):
+    """
+    Recompute friend_count and post_count for every user, in batches.
+    :param batch_size: The number of users updated per query.
+    :return: The number of updated users.
+    """
+    updated, after = 0, ""
+    while True:
+        page = evaluate(queries.USER_DEGREE_COUNTS_PAGE, after=after, limit=batch_size)
+        if not page["count"]:
+            return updated
+        updated += page["count"]
+        after = page["last_id"]
+
+def friendship_ids(user_id, friend_id):
+    """
+    Return the ids of a friendship in canonical order: its relationship goes
+    from the lower id to the higher one.
+    """
+    return {"low_id": min(user_id, friend_id), "high_id": max(user_id, friend_id)}
+
+def migrate_friendships(batch_size=BATCH_SIZE):
+    """
+    Collapse duplicate and reversed friendships into one relationship from the
+    lower id to the higher one, in batches, then recompute the degree counts.
+    The API keeps working meanwhile: it reads friendships in both directions.
+    :param batch_size: The number of users processed per query.
+    :return: The number of fixed pairs and of users with recomputed counts.
+    """
+    fixed, after = 0, ""
+    while True:
+        page = evaluate(queries.FRIENDSHIP_CANONICAL_PAGE, after=after, limit=batch_size)
+        if not page["count"]:
+            break
+        fixed += page["fixed"]
+        after = page["last_id"]
+    return {"pairs": fixed, "users": update_degree_counts(batch_size)}
+
+def bench_friends(users=20, repeat=5):
+    """
+    Time the friendship reads on the users with the most friends, and count
+    the FRIENDS_WITH relationships they traverse: run it before and after
+    migrate_friendships to measure the savings.
+    :param users: The number of users sampled.
+    :param repeat: The number of runs of each query.
+    :return: The relationship and pair counts, and the mean duration (ms) of
+             get_friends and get_mutual_friends.
+    """
+    report = dict(evaluate(queries.FRIENDSHIP_EDGES))
+    report["duplicates"] = report["relationships"] - report["pairs"]
+    ids = [user["id"] for user in evaluate(queries.USER_TOP_FRIEND_COUNT, limit=users)]
+    timings = {"get_friends_ms": [], "mutual_friends_ms": []}
+    for _ in range(repeat):
+        for user_id, other_id in zip(ids, ids[1:] + ids[:1]):
+            start = time.perf_counter()
+            evaluate(queries.USER_GET_FRIENDS, user_id=user_id, limit=MAX_RESULTS, after=None)
+            timings["get_friends_ms"].append((time.perf_counter() - start) * 1000)
+            start = time.perf_counter()
+            evaluate(queries.USER_MUTUAL_FRIENDS, user_id=user_id, other_id=other_id,
+                     limit=MAX_RESULTS)
+            timings["mutual_friends_ms"].append((time.perf_counter() - start) * 1000)
+    report["users"] = len(ids)
+    for name, values in timings.items():
+        report[name] = sum(values) / len(values) if values else None
+    return report
+
+def bench_save_many(rows=10000, batch_sizes=(100, 1000, 5000)):
+    """
+    Time User.save_many and Post.save_many (one post per user) for each
+    batch size, then delete the created users and posts.
+    :param rows: The number of users, and of posts, written per run.
+    :param batch_sizes: The batch sizes compared.
+    :return: One report per batch size with the rows written per second.
+    """
+    reports = []
+    for batch_size in batch_sizes:
+        users = [User(f"bench {i}", f"bench-{new_id()}@bench.invalid") for i in range(rows)]
+        posts = [Post("bench", "bench", user.id) for user in users]
+        try:
+            start = time.perf_counter()
+            created_users = User.save_many(users, batch_size)
+            users_s = time.perf_counter() - start
+            start = time.perf_counter()
+            created_posts = Post.save_many(posts, batch_size)
+            posts_s = time.perf_counter() - start
+        finally:
+            run_batches(queries.BENCH_DELETE_USERS, [{"id": user.id} for user in users],
+                        ("id",), batch_size)
+        reports.append({"batch_size": batch_size,
+                        "users": created_users, "users_per_s": created_users / users_s,
+                        "posts": created_posts, "posts_per_s": created_posts / posts_s})
+    return reports
+
+def is_supernode(user):
+    """
+    Tell whether a user, as returned by User.find_by_id, has a high degree.
+    """
+    return (user.get("friend_count") or 0) + (user.get("post_count") or 0) >= SUPERNODE_DEGREE
+
+def top_degree(limit=20):
+    """
+    Report the users with the most friends and the most posts.
+    :param limit: The number of users in each list.
+    :return: A dictionary with the "friends" and "posts" lists.
+    """
+    return {"friends": evaluate(queries.USER_TOP_FRIEND_COUNT, limit=limit),
+            "posts": evaluate(queries.USER_TOP_POST_COUNT, limit=limit)}
+
+def now():
+    return datetime.now(utc)
+
+def to_timestamp(value):
+    """
+    Return a created_at value (DateTime or legacy float) in seconds since the epoch.
+    """
+    if hasattr(value, "to_native"):
+        value = value.to_native()
+    if isinstance(value, datetime):
+        return value.timestamp()
+    return value
+
+def time_window(since=None, until=None):
+    """
+    Build the $since and $until parameters of a time-window query.
+    :param since: Optional aware datetime, included.
+    :param until: Optional aware datetime, excluded.
+    :return: A dictionary of query parameters.
+    """
+    return {"since": since or EARLIEST, "until": until or LATEST}
+
+def build_existence_filter(page_size=10000):
+    """
+    Stream every id and email into a new Bloom filter, then start using it.
+    Sized for twice the current number of keys (at least 100 000 more).
+    :param page_size: The number of nodes read per query.
+    :return: The filter report.
+    """
+    start = time.perf_counter()
+    keys = evaluate(queries.EXISTENCE_COUNT) or 0
+    bloom = existence.BloomFilter(max(2 * keys, keys + 100000))
+    for label, query in queries.EXISTENCE_IDS.items():
+        after = ""
+        while True:
+            rows = evaluate(query, after=after, limit=page_size)
+            if not rows:
+                break
+            for row in rows:
+                if label == "User":
+                    node_id, email = row
+                    bloom.add(existence._key("email", email))
+                else:
+                    node_id = row
+                bloom.add(existence._key(label, node_id))
+            after = node_id
+    existence.install(bloom, (time.perf_counter() - start) * 1000)
+    return existence.report()
+
+def apply_schema():
+    """
+    Create the constraints and indexes declared in queries.SCHEMA.
+    """
+    graph = get_graph()
+    for statement in queries.SCHEMA:
+        graph.run(statement)
 
 def dict_to_node(label, properties):
     """
@@ -12,20 +390,90 @@ def dict_to_node(label, properties):
     :param properties: A dictionary of properties for the node.
     :return: A py2neo Node object.
     """
+    from py2neo import Node
     if not isinstance(properties, dict):
         raise ValueError("Properties must be a dictionary")
     return Node(label, **properties)
 
+@coalesced
+def find_by_ids(*lookups):
+    """
+    Fetch several independent nodes with a single query.
+    :param lookups: (label, id) pairs, e.g. ("User", user_id).
+    :return: A list with the properties of each node (or None), in lookup order.
+    """
+    query = queries.lookup(*(label for label, _ in lookups))
+    params = {f"id{i}": node_id for i, (_, node_id) in enumerate(lookups)}
+    return evaluate(query, **params) or [None] * len(lookups)
+
+@coalesced
+def find_many(label, ids, fields=None):
+    """
+    Fetch many nodes of one label by id with a single query.
+    :param label: "User", "Post" or "Comment".
+    :param ids: The ids, possibly repeated.
+    :param fields: Property names from queries.FIELDS[label], or None for all.
+    :return: A list with the properties of each node (or None), in ids order.
+    """
+    unique = list(dict.fromkeys(ids))
+    found = dict(evaluate(select(queries.FIND_MANY[label], label, fields), ids=unique) or [])
+    return [found.get(node_id) for node_id in ids]
+
+def select(query, label, fields=None):
+    """
+    Return a read query, or its variant returning only some properties.
+    :param query: A statement from queries returning properties(...) of label nodes.
+    :param label: The label of the returned nodes.
+    :param fields: Property names from queries.FIELDS[label], or None for all.
+    :return: The Cypher statement.
+    :raises ValueError: If a field is not allowed.
+    """
+    if not fields:
+        return query
+    return queries.project(query, label, tuple(sorted(set(fields))))
+
+def to_columns(rows, keys):
+    """
+    Transpose a list of dictionaries into one list per key.
+    Sending columns rather than one map per row avoids repeating every
+    property name for every row in the query parameters.
+    :param rows: A list of dictionaries.
+    :param keys: The keys to extract from each row.
+    :return: A dictionary mapping each key to the list of its values.
+    """
+    return {key: [row[key] for row in rows] for key in keys}
+
+def run_batches(query, rows, keys, batch_size=BATCH_SIZE):
+    """
+    Run an UNWIND query over rows, one auto-commit transaction per batch.
+    The query iterates `UNWIND range(0, size($id) - 1) AS i` and reads the
+    values of row i as $key[i].
+    :param query: The Cypher query to run for each batch.
+    :param rows: A list of dictionaries.
+    :param keys: The keys sent as parameters.
+    :param batch_size: The number of rows sent per query.
+    :return: The aggregated query statistics.
+    """
+    totals = {}
+    for start in range(0, len(rows), batch_size):
+        batch = to_columns(rows[start:start + batch_size], keys)
+        for key, value in run(query, **batch).stats().items():
+            if isinstance(value, int) and not isinstance(value, bool):
+                totals[key] = totals.get(key, 0) + value
+    return totals
+
 class User:
     def __init__(self, name, email):
         self.name = name
         self.email = email
-        self.created_at = datetime.now().timestamp()
-        self.id = str(uuid.uuid4())
+        self.created_at = now()
+        self.id = new_id()
 
     def save(self):
-        # Vérifiez si un utilisateur avec le même email existe déjà
-        existing_user = graph.evaluate("MATCH (u:User {email: $email}) RETURN u", email=self.email)
+        # Vérifiez si un utilisateur avec le même email existe déjà (inutile
+        # si le filtre d'existence ne connaît pas cet email)
+        existing_user = (existence.might_exist("email", self.email)
+                         and evaluate(queries.USER_EMAIL_EXISTS, email=self.email))
         if existing_user:
             raise ValueError(f"An account with email {self.email} already exists.")
         
@@ -35,296 +483,311 @@ class User:
             return self  # Ne recrée pas l'utilisateur s'il existe déjà
         
         # Crée un nouvel utilisateur si inexistant
-        user_node = Node("User",
-                        id=self.id,
-                        name=self.name,
-                        email=self.email,
-                        created_at=self.created_at)
-        graph.create(user_node)
+        user_props = {"id": self.id,
+                      "name": self.name,
+                      "email": self.email,
+                      "created_at": self.created_at}
+        # Ajoutés au filtre avant l'écriture : jamais de 404 pour un nœud créé
+        existence.add("User", self.id)
+        existence.add("email", self.email)
+        try:
+            run(queries.USER_CREATE, props=user_props)
+        except Exception as e:
+            check_email_constraint(e, self.email)
+            raise
         return self
     
     @staticmethod
-    def find_all():
-        query = "MATCH (u:User) RETURN properties(u) AS user"
-        return [record["user"] for record in graph.run(query)]
+    def save_many(users, batch_size=BATCH_SIZE):
+        # Les emails déjà utilisés sont ignorés plutôt que de lever une erreur
+        for user in users:
+            existence.add("User", user.id)
+            existence.add("email", user.email)
+        stats = run_batches(queries.USER_CREATE_MANY, [vars(user) for user in users],
+                            ("id", "name", "email", "created_at"), batch_size)
+        return stats.get("nodes_created", 0)
+    
+    @staticmethod
+    @coalesced
+    def find_all(since=None, until=None, fields=None):
+        if since is None and until is None:
+            return evaluate(select(queries.USER_FIND_ALL, "User", fields))
+        return evaluate(select(queries.USER_FIND_WINDOW, "User", fields),
+                        **time_window(since, until))
+    
+    @staticmethod
+    def find_many(user_ids, fields=None):
+        return find_many("User", user_ids, fields)
     
     @staticmethod
-    def find_by_id(user_id):
-        query = "MATCH (u:User {id: $id}) RETURN properties(u) AS user"
-        result = graph.run(query, id=user_id).data()
-        return result[0]["user"] if result else None
+    @coalesced
+    def find_by_id(user_id, fields=None):
+        # Id absent du filtre d'existence (ou introuvable il y a un instant)
+        if existence.known_missing("User", user_id):
+            return None
+        user = evaluate(select(queries.USER_FIND_BY_ID, "User", fields), id=user_id)
+        if user is None:
+            existence.missed("User", user_id)
+        return user
     
     @staticmethod
     def update(user_id, name=None, email=None):
-        update_query = "MATCH (u:User {id: $id})"
-        if name and email:
-            update_query += " SET u.name = $name, u.email = $email"
-            graph.run(update_query, id=user_id, name=name, email=email)
-        elif name:
-            update_query += " SET u.name = $name"
-            graph.run(update_query, id=user_id, name=name)
-        elif email:
-            update_query += " SET u.email = $email"
-            graph.run(update_query, id=user_id, email=email)
-        
-        return User.find_by_id(user_id)
+        # Une seule requête : les champs absents gardent leur valeur
+        if email:
+            existence.add("email", email)
+        try:
+            return evaluate(queries.USER_UPDATE, id=user_id, name=name or None, email=email or None)
+        except Exception as e:
+            check_email_constraint(e, email)
+            raise
     
     @staticmethod
-    def delete(user_id):
-        # Supprime les posts créés par l'utilisateur
-        graph.run("""
-        MATCH (u:User {id: $id})-[:CREATED]->(p:Post)
-        DETACH DELETE p
-        """, id=user_id)
-        
-        # Supprime les commentaires créés par l'utilisateur
-        graph.run("""
-        MATCH (u:User {id: $id})-[:CREATED]->(c:Comment)
-        DETACH DELETE c
-        """, id=user_id)
-        
-        # Supprime les likes de l'utilisateur sur les posts
-        graph.run("""
-        MATCH (u:User {id: $id})-[r:LIKES]->(p:Post)
-        DELETE r
-        """, id=user_id)
-        
-        # Supprime les likes de l'utilisateur sur les commentaires
-        graph.run("""
-        MATCH (u:User {id: $id})-[r:LIKES]->(c:Comment)
-        DELETE r
-        """, id=user_id)
-        
-        # Supprime toutes les relations d'amitié
-        graph.run("""
-        MATCH (u:User {id: $id})-[r:FRIENDS_WITH]-()
-        DELETE r
-        """, id=user_id)
-        
-        # Supprime le nœud utilisateur
-        graph.run("MATCH (u:User {id: $id}) DETACH DELETE u", id=user_id)
+    def delete(user_id, paged=False, batch_size=BATCH_SIZE):
+        if not paged:
+            # Supprime les posts et commentaires créés par l'utilisateur, puis
+            # l'utilisateur avec ses likes et amitiés, en une seule requête
+            run(queries.USER_DELETE, id=user_id)
+            return
+        # Supernœud : une transaction par lot de relations, puis de nœuds créés
+        for query in (queries.USER_DELETE_RELATIONSHIPS_PAGE, queries.USER_DELETE_CREATED_PAGE):
+            while evaluate(query, id=user_id, limit=batch_size) == batch_size:
+                pass
+        run(queries.USER_DELETE_NODE, id=user_id)
     
     @staticmethod
     def add_friend(user_id, friend_id):
-        query = """
-        MATCH (u:User {id: $user_id}), (f:User {id: $friend_id})
-        MERGE (u)-[r:FRIENDS_WITH]->(f)
-        RETURN u, f
-        """
-        return graph.run(query, user_id=user_id, friend_id=friend_id).data()
+        return run(queries.USER_ADD_FRIEND, **friendship_ids(user_id, friend_id)).data()
     
     @staticmethod
     def remove_friend(user_id, friend_id):
-        query = """
-        MATCH (u:User {id: $user_id})-[r:FRIENDS_WITH]-(f:User {id: $friend_id})
-        DELETE r
-        """
-        graph.run(query, user_id=user_id, friend_id=friend_id)
+        run(queries.USER_REMOVE_FRIEND, **friendship_ids(user_id, friend_id))
     
     @staticmethod
-    def get_friends(user_id):
-        query = """
-        MATCH (u:User {id: $user_id})-[:FRIENDS_WITH]-(f:User)
-        RETURN properties(f) AS friend
-        """
-        return [record["friend"] for record in graph.run(query, user_id=user_id)]
+    @coalesced
+    def get_friends(user_id, limit=MAX_RESULTS, after=None, fields=None):
+        # Au plus MAX_RESULTS amis par page, triés par id
+        return evaluate(select(queries.USER_GET_FRIENDS, "User", fields), user_id=user_id,
+                        limit=min(limit, MAX_RESULTS), after=after)
     
     @staticmethod
+    @coalesced
     def are_friends(user_id, friend_id):
-        query = """
-        MATCH (u:User {id: $user_id})-[r:FRIENDS_WITH]-(f:User {id: $friend_id})
-        RETURN COUNT(r) > 0 as are_friends
-        """
-        result = graph.run(query, user_id=user_id, friend_id=friend_id).data()
-        return result[0]["are_friends"] if result else False
+        return bool(evaluate(queries.USER_ARE_FRIENDS, **friendship_ids(user_id, friend_id)))
     
     @staticmethod
-    def get_mutual_friends(user_id, other_id):
-        query = """
-        MATCH (u:User {id: $user_id})-[:FRIENDS_WITH]-(mutual:User)-[:FRIENDS_WITH]-(other:User {id: $other_id})
-        RETURN properties(mutual) AS mutual_friend
+    @coalesced
+    def get_mutual_friends(user_id, other_id, limit=MAX_RESULTS, fields=None):
+        return evaluate(select(queries.USER_MUTUAL_FRIENDS, "User", fields),
+                        user_id=user_id, other_id=other_id,
+                        limit=min(limit, MAX_RESULTS))
+    
+    @staticmethod
+    def check_relations(user_id, post_ids=(), comment_ids=(), user_ids=()):
         """
-        return [record["mutual_friend"] for record in graph.run(query, user_id=user_id, other_id=other_id)]
+        Answer, in one query, whether the user liked each post and comment
+        and is friends with each user.
+        :return: {"posts": {id: liked}, "comments": {id: liked},
+                  "users": {id: friends}}, or None if the user does not exist.
+        """
+        found = evaluate(queries.USER_CHECK_RELATIONS, user_id=user_id, post_ids=list(post_ids),
+                         comment_ids=list(comment_ids), user_ids=list(user_ids))
+        if found is None:
+            return None
+        relations = {}
+        for key, ids in (("posts", post_ids), ("comments", comment_ids), ("users", user_ids)):
+            matched = set(found[key])
+            relations[key] = {item_id: item_id in matched for item_id in ids}
+        return relations
+    
+    @staticmethod
+    @coalesced
+    def get_community(user_id):
+        # Communauté calculée par `flask communities`, avec son nombre de membres
+        return evaluate(queries.USER_COMMUNITY, id=user_id)
 
 
 class Post:
     def __init__(self, title, content, user_id):
         self.title = title
         self.content = content
-        self.created_at = datetime.now().timestamp()
+        self.created_at = now()
         self.user_id = user_id
-        self.id = str(uuid.uuid4())
+        self.id = new_id()
     
     def save(self):
         # Crée le nœud du post
-        post_node = Node("Post",
-                        id=self.id,
-                        title=self.title,
-                        content=self.content,
-                        created_at=self.created_at)
+        post_props = {"id": self.id,
+                      "title": self.title,
+                      "content": self.content,
+                      "created_at": self.created_at}
         
-        # Trouve l'utilisateur
-        user_dict = User.find_by_id(self.user_id)
-        if not user_dict:
+        # Crée le post et sa relation avec l'utilisateur en une seule requête
+        existence.add("Post", self.id)
+        created = evaluate(queries.POST_CREATE, user_id=self.user_id, props=post_props)
+        if not created:
             raise ValueError(f"User with id {self.user_id} not found")
         
-        # Convertit le dictionnaire utilisateur en nœud
-        user_node = graph.evaluate("MATCH (u:User {id: $id}) RETURN u", id=self.user_id)
-        
-        # Crée la relation
-        created_rel = Relationship(user_node, "CREATED", post_node)
-        
-        # Ajoute le post et la relation dans la base de données
-        tx = graph.begin()
-        tx.create(post_node)
-        tx.create(created_rel)
-        tx.commit()
-        
         return self
+    
+    @staticmethod
+    def save_many(posts, batch_size=BATCH_SIZE):
+        # Les posts dont l'auteur n'existe pas sont ignorés
+        for post in posts:
+            existence.add("Post", post.id)
+        stats = run_batches(queries.POST_CREATE_MANY, [vars(post) for post in posts],
+                            ("id", "user_id", "title", "content", "created_at"), batch_size)
+        return stats.get("nodes_created", 0)
         
     @staticmethod
-    def find_all():
-        query = "MATCH (p:Post) RETURN properties(p) AS post"
-        return [record["post"] for record in graph.run(query)]
+    @coalesced
+    def find_all(limit=None, before=None, since=None, until=None, fields=None):
+        # Avec une fenêtre de temps : parcours de l'index sur created_at
+        if since is not None or until is not None:
+            query = queries.POST_FIND_WINDOW if limit is None else queries.POST_FIND_WINDOW_LATEST
+            return evaluate(select(query, "Post", fields), limit=limit,
+                            before=before, **time_window(since, until))
+        # Avec une limite : les posts les plus récents, avant l'id `before`
+        if limit is None:
+            return evaluate(select(queries.POST_FIND_ALL, "Post", fields))
+        return evaluate(select(queries.POST_FIND_LATEST, "Post", fields), limit=limit,
+                        before=before or MAX_ID)
+    
+    @staticmethod
+    def find_many(post_ids, fields=None):
+        return find_many("Post", post_ids, fields)
     
     @staticmethod
-    def find_by_id(post_id):
-        query = "MATCH (p:Post {id: $id}) RETURN properties(p) AS post"
-        result = graph.run(query, id=post_id).data()
-        return result[0]["post"] if result else None
+    @coalesced
+    def find_by_id(post_id, fields=None):
+        # Id absent du filtre d'existence (ou introuvable il y a un instant)
+        if existence.known_missing("Post", post_id):
+            return None
+        post = evaluate(select(queries.POST_FIND_BY_ID, "Post", fields), id=post_id)
+        if post is None:
+            existence.missed("Post", post_id)
+        return post
     
     @staticmethod
-    def find_by_user(user_id):
-        query = """
-        MATCH (u:User {id: $user_id})-[:CREATED]->(p:Post)
-        RETURN properties(p) AS post
+    @coalesced
+    def find_detail(post_id, include=(), viewer=None, comments_limit=20, fields=None):
         """
-        return [record["post"] for record in graph.run(query, user_id=user_id)]
+        Fetch a post with its author, latest comments, counts or viewer state
+        in one query.
+        :param include: Names from queries.POST_INCLUDES.
+        :param viewer: The id of the user for "viewer_liked".
+        :param comments_limit: The number of comments for "comments".
+        :param fields: The post properties to return (default: all).
+        :return: The post properties with one key per include, or None.
+        """
+        query = queries.post_detail(tuple(sorted(set(include))), tuple(sorted(set(fields or ()))))
+        return evaluate(query, id=post_id, viewer=viewer,
+                        comments_limit=max(0, min(comments_limit, MAX_RESULTS)))
+    
+    @staticmethod
+    @coalesced
+    def find_by_user(user_id, since=None, until=None, fields=None):
+        if since is None and until is None:
+            return evaluate(select(queries.POST_FIND_BY_USER, "Post", fields), user_id=user_id)
+        return evaluate(select(queries.POST_FIND_BY_USER_WINDOW, "Post", fields), user_id=user_id,
+                        **time_window(since, until))
     
     @staticmethod
     def update(post_id, title=None, content=None):
-        update_query = "MATCH (p:Post {id: $id})"
-        if title and content:
-            update_query += " SET p.title = $title, p.content = $content"
-            graph.run(update_query, id=post_id, title=title, content=content)
-        elif title:
-            update_query += " SET p.title = $title"
-            graph.run(update_query, id=post_id, title=title)
-        elif content:
-            update_query += " SET p.content = $content"
-            graph.run(update_query, id=post_id, content=content)
-        
-        return Post.find_by_id(post_id)
+        return evaluate(queries.POST_UPDATE, id=post_id, title=title or None, content=content or None)
     
     @staticmethod
     def delete(post_id):
-        # First delete all relationships
-        graph.run("MATCH (p:Post {id: $id})-[r]-() DELETE r", id=post_id)
-        # Then delete the post node
-        graph.run("MATCH (p:Post {id: $id}) DELETE p", id=post_id)
+        # Delete the post node together with all its relationships
+        run(queries.POST_DELETE, id=post_id)
     
     @staticmethod
     def add_like(post_id, user_id):
-        query = """
-        MATCH (u:User {id: $user_id}), (p:Post {id: $post_id})
-        MERGE (u)-[r:LIKES]->(p)
-        RETURN u, p
-        """
-        return graph.run(query, user_id=user_id, post_id=post_id).data()
+        return run(queries.POST_ADD_LIKE, user_id=user_id, post_id=post_id).data()
     
     @staticmethod
     def remove_like(post_id, user_id):
-        query = """
-        MATCH (u:User {id: $user_id})-[r:LIKES]->(p:Post {id: $post_id})
-        DELETE r
-        """
-        graph.run(query, user_id=user_id, post_id=post_id)
+        run(queries.POST_REMOVE_LIKE, user_id=user_id, post_id=post_id)
 
 
 class Comment:
     def __init__(self, content, user_id, post_id):
         self.content = content
-        self.created_at = datetime.now().timestamp()
+        self.created_at = now()
         self.user_id = user_id
         self.post_id = post_id
-        self.id = str(uuid.uuid4())
+        self.id = new_id()
     
     def save(self):
-        # Create comment node
-        comment_node = Node("Comment",
-                          id=self.id,
-                          content=self.content,
-                          created_at=self.created_at)
+        comment_props = {"id": self.id,
+                         "content": self.content,
+                         "created_at": self.created_at}
         
-        # Find the user and post as Neo4j nodes
-        user_node = graph.evaluate("MATCH (u:User {id: $id}) RETURN u", id=self.user_id)
-        post_node = graph.evaluate("MATCH (p:Post {id: $id}) RETURN p", id=self.post_id)
+        # Create the comment and both relationships in a single query,
+        # only if the user and the post exist
+        existence.add("Comment", self.id)
+        user_found, post_found = evaluate(queries.COMMENT_CREATE, user_id=self.user_id,
+                                          post_id=self.post_id, props=comment_props)
         
-        if not user_node:
+        if not user_found:
             raise ValueError(f"User with id {self.user_id} not found")
-        if not post_node:
+        if not post_found:
             raise ValueError(f"Post with id {self.post_id} not found")
         
-        # Create relationships
-        created_rel = Relationship(user_node, "CREATED", comment_node)
-        has_comment_rel = Relationship(post_node, "HAS_COMMENT", comment_node)
-        
-        # Create everything in the database
-        tx = graph.begin()
-        tx.create(comment_node)
-        tx.create(created_rel)
-        tx.create(has_comment_rel)
-        tx.commit()
-        
         return self
     
     @staticmethod
-    def find_all():
-        query = "MATCH (c:Comment) RETURN properties(c) AS comment"
-        return [record["comment"] for record in graph.run(query)]
+    def save_many(comments, batch_size=BATCH_SIZE):
+        # Les commentaires dont l'auteur ou le post n'existe pas sont ignorés
+        for comment in comments:
+            existence.add("Comment", comment.id)
+        stats = run_batches(queries.COMMENT_CREATE_MANY, [vars(comment) for comment in comments],
+                            ("id", "user_id", "post_id", "content", "created_at"), batch_size)
+        return stats.get("nodes_created", 0)
     
     @staticmethod
-    def find_by_id(comment_id):
-        query = "MATCH (c:Comment {id: $id}) RETURN properties(c) AS comment"
-        result = graph.run(query, id=comment_id).data()
-        return result[0]["comment"] if result else None
+    @coalesced
+    def find_all(since=None, until=None, fields=None):
+        if since is None and until is None:
+            return evaluate(select(queries.COMMENT_FIND_ALL, "Comment", fields))
+        return evaluate(select(queries.COMMENT_FIND_WINDOW, "Comment", fields),
+                        **time_window(since, until))
     
     @staticmethod
-    def find_by_post(post_id):
-        query = """
-        MATCH (p:Post {id: $post_id})-[:HAS_COMMENT]->(c:Comment)
-        RETURN properties(c) AS comment
-        """
-        return [record["comment"] for record in graph.run(query, post_id=post_id)]
+    def find_many(comment_ids, fields=None):
+        return find_many("Comment", comment_ids, fields)
+    
+    @staticmethod
+    @coalesced
+    def find_by_id(comment_id, fields=None):
+        # Id absent du filtre d'existence (ou introuvable il y a un instant)
+        if existence.known_missing("Comment", comment_id):
+            return None
+        comment = evaluate(select(queries.COMMENT_FIND_BY_ID, "Comment", fields), id=comment_id)
+        if comment is None:
+            existence.missed("Comment", comment_id)
+        return comment
+    
+    @staticmethod
+    @coalesced
+    def find_by_post(post_id, since=None, until=None, fields=None):
+        if since is None and until is None:
+            return evaluate(select(queries.COMMENT_FIND_BY_POST, "Comment", fields), post_id=post_id)
+        return evaluate(select(queries.COMMENT_FIND_BY_POST_WINDOW, "Comment", fields), post_id=post_id,
+                        **time_window(since, until))
     
     @staticmethod
     def update(comment_id, content=None):
-        if content:
-            update_query = "MATCH (c:Comment {id: $id}) SET c.content = $content"
-            graph.run(update_query, id=comment_id, content=content)
-        
-        return Comment.find_by_id(comment_id)
+        return evaluate(queries.COMMENT_UPDATE, id=comment_id, content=content or None)
     
     @staticmethod
     def delete(comment_id):
-        # First delete all relationships
-        graph.run("MATCH (c:Comment {id: $id})-[r]-() DELETE r", id=comment_id)
-        # Then delete the comment node
-        graph.run("MATCH (c:Comment {id: $id}) DELETE c", id=comment_id)
+        # Delete the comment node together with all its relationships
+        run(queries.COMMENT_DELETE, id=comment_id)
     
     @staticmethod
     def add_like(comment_id, user_id):
-        query = """
-        MATCH (u:User {id: $user_id}), (c:Comment {id: $comment_id})
-        MERGE (u)-[r:LIKES]->(c)
-        RETURN u, c
-        """
-        return graph.run(query, user_id=user_id, comment_id=comment_id).data()
+        return run(queries.COMMENT_ADD_LIKE, user_id=user_id, comment_id=comment_id).data()
     
     @staticmethod
     def remove_like(comment_id, user_id):
-        query = """
-        MATCH (u:User {id: $user_id})-[r:LIKES]->(c:Comment {id: $comment_id})
-        DELETE r
-        """
-        graph.run(query, user_id=user_id, comment_id=comment_id)
+        run(queries.COMMENT_REMOVE_LIKE, user_id=user_id, comment_id=comment_id)
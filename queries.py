@@ -0,0 +1,663 @@
+from datetime import datetime
+from functools import lru_cache
+from threading import Lock
+import re
+
+from pytz import utc
+
+# Toutes les requêtes Cypher émises par models.py, enregistrées par nom.
+# Le préchauffage (warmup) exécute EXPLAIN sur chacune au démarrage, avec
+# des paramètres d'exemple (PARAMETERS) : sans eux, Neo4j signale
+# ParameterNotProvided et ne met pas le plan en cache.
+STATEMENTS = {}
+PARAMETERS = {}
+
+# Valeur d'exemple de chaque paramètre, du type envoyé par models.py ; les
+# autres paramètres (ids, textes, curseurs) sont des chaînes
+SAMPLE_VALUES = {
+    "limit": 1,
+    "comments_limit": 1,
+    "since": datetime(2000, 1, 1, tzinfo=utc),
+    "until": datetime(2000, 1, 1, tzinfo=utc),
+    "created_at": datetime(2000, 1, 1, tzinfo=utc),
+    "pagerank": 0.0,
+    "props": {"id": ""},
+}
+
+def sample_parameters(cypher):
+    """
+    Build example parameters for a statement: a list for the columns of a
+    batch ($id[i], size($id)) and the lists read by UNWIND, a single value
+    of the right type otherwise.
+    :param cypher: A Cypher statement.
+    :return: A dictionary of parameters.
+    """
+    parameters = {}
+    for name in set(re.findall(r"\$(\w+)", cypher)):
+        value = SAMPLE_VALUES.get(name, "")
+        if re.search(rf"\${name}\[|size\(\${name}\)|UNWIND \${name}\b", cypher):
+            value = [value]
+        parameters[name] = value
+    return parameters
+
+# Les variantes (project, lookup, post_detail) sont enregistrées pendant que
+# l'application sert des requêtes : lru_cache n'empêche pas deux threads de
+# construire la même en même temps
+_lock = Lock()
+
+def register(name, cypher, parameters=None):
+    """
+    Register a Cypher statement under a unique name. Registering the same
+    statement again under the same name is allowed.
+    :param name: The statement name, e.g. "user.find_by_id".
+    :param cypher: The Cypher statement.
+    :param parameters: Example parameters for EXPLAIN (default: sample_parameters).
+    :return: The Cypher statement, unchanged.
+    """
+    if parameters is None:
+        parameters = sample_parameters(cypher)
+    with _lock:
+        if STATEMENTS.get(name, cypher) != cypher:
+            raise ValueError(f"Statement {name} is already registered")
+        STATEMENTS[name] = cypher
+        PARAMETERS[name] = parameters
+    return cypher
+
+def _name_of(cypher):
+    """
+    Return the name under which a statement was registered.
+    """
+    with _lock:
+        return next(name for name, statement in STATEMENTS.items() if statement == cypher)
+
+
+# Schéma : contraintes et index, appliqués par `flask init-schema`.
+# Ils ne passent pas par EXPLAIN et ne sont donc pas dans STATEMENTS.
+SCHEMA = [
+    # Les contraintes d'unicité créent aussi l'index sur id, que les
+    # identifiants ULID permettent de parcourir dans l'ordre chronologique
+    "CREATE CONSTRAINT user_id IF NOT EXISTS FOR (u:User) REQUIRE u.id IS UNIQUE",
+    "CREATE CONSTRAINT post_id IF NOT EXISTS FOR (p:Post) REQUIRE p.id IS UNIQUE",
+    "CREATE CONSTRAINT comment_id IF NOT EXISTS FOR (c:Comment) REQUIRE c.id IS UNIQUE",
+    # Garantit l'unicité des emails même quand le filtre d'existence dispense
+    # User.save de la vérifier (et indexe user.email_exists)
+    "CREATE CONSTRAINT user_email IF NOT EXISTS FOR (u:User) REQUIRE u.email IS UNIQUE",
+    "CREATE INDEX user_legacy_id IF NOT EXISTS FOR (u:User) ON (u.legacy_id)",
+    "CREATE INDEX post_legacy_id IF NOT EXISTS FOR (p:Post) ON (p.legacy_id)",
+    "CREATE INDEX comment_legacy_id IF NOT EXISTS FOR (c:Comment) ON (c.legacy_id)",
+    # Index d'intervalle sur les dates de création (DateTime) : filtres since/until
+    "CREATE RANGE INDEX user_created_at IF NOT EXISTS FOR (u:User) ON (u.created_at)",
+    "CREATE RANGE INDEX post_created_at IF NOT EXISTS FOR (p:Post) ON (p.created_at)",
+    "CREATE RANGE INDEX comment_created_at IF NOT EXISTS FOR (c:Comment) ON (c.created_at)",
+    "CREATE INDEX user_community IF NOT EXISTS FOR (u:User) ON (u.community)",
+    "CREATE INDEX user_community_stale IF NOT EXISTS FOR (u:User) ON (u.community_stale)",
+    # Degrés tenus à jour à l'écriture : rapport des supernœuds
+    "CREATE RANGE INDEX user_friend_count IF NOT EXISTS FOR (u:User) ON (u.friend_count)",
+    "CREATE RANGE INDEX user_post_count IF NOT EXISTS FOR (u:User) ON (u.post_count)",
+]
+
+
+# Propriétés que le paramètre ?fields= peut demander, par label
+FIELDS = {
+    "User": ("id", "name", "email", "created_at", "friend_count", "post_count",
+             "pagerank", "community"),
+    "Post": ("id", "title", "content", "created_at"),
+    "Comment": ("id", "content", "created_at"),
+}
+
+def _check_fields(label, fields):
+    for field in fields:
+        if field not in FIELDS[label]:
+            raise ValueError(f"Unknown field {field} for {label}")
+
+@lru_cache(maxsize=None)
+def project(cypher, label, fields):
+    """
+    Build (and register) the variant of a statement that returns only some
+    properties of each node: properties(n) becomes n {.id, .title}.
+    :param cypher: A registered statement returning properties(...) of label nodes.
+    :param label: The label of the returned nodes.
+    :param fields: The property names, from FIELDS[label], in a canonical order.
+    :return: The Cypher statement.
+    """
+    _check_fields(label, fields)
+    name = _name_of(cypher)
+    projection = "{" + ", ".join("." + field for field in fields) + "}"
+    projected = re.sub(r"properties\((\w+)\)", lambda m: f"{m.group(1)} {projection}", cypher)
+    return register(f"{name}[{','.join(fields)}]", projected)
+
+
+# Lookups
+@lru_cache(maxsize=None)
+def lookup(*labels):
+    """
+    Build (and register) the query fetching one node per label by id.
+    Parameters are named $id0, $id1, ... in label order.
+    :param labels: The labels of the nodes, e.g. ("User", "Post").
+    :return: The Cypher statement.
+    """
+    for label in labels:
+        if label not in ("User", "Post", "Comment"):
+            raise ValueError(f"Unknown label {label}")
+    matches = [f"OPTIONAL MATCH (n{i}:{label} {{id: $id{i}}})" for i, label in enumerate(labels)]
+    projection = ", ".join(f"properties(n{i})" for i in range(len(labels)))
+    cypher = "\n".join(matches) + f"\nRETURN [{projection}] AS nodes"
+    return register("lookup." + ".".join(labels), cypher)
+
+# Combinaisons utilisées par les routes
+lookup("User", "User")
+lookup("Post", "User")
+lookup("Comment", "User")
+
+
+# Multi-get : plusieurs nœuds d'un même label par id, en une requête.
+# Chaque nœud trouvé est renvoyé avec l'id demandé, pour garder l'ordre
+def _find_many(label):
+    return register(f"{label.lower()}.find_many", f"""
+UNWIND $ids AS id
+MATCH (n:{label} {{id: id}})
+RETURN collect([id, properties(n)]) AS nodes
+""")
+
+FIND_MANY = {label: _find_many(label) for label in ("User", "Post", "Comment")}
+
+
+# Users
+USER_EMAIL_EXISTS = register("user.email_exists", "MATCH (u:User {email: $email}) RETURN u.id")
+
+USER_CREATE = register("user.create", "CREATE (u:User $props)")
+
+USER_CREATE_MANY = register("user.create_many", """
+UNWIND range(0, size($id) - 1) AS i
+MERGE (u:User {email: $email[i]})
+ON CREATE SET u.id = $id[i], u.name = $name[i], u.created_at = $created_at[i]
+""")
+
+USER_FIND_ALL = register("user.find_all", "MATCH (u:User) RETURN collect(properties(u)) AS users")
+
+USER_FIND_WINDOW = register("user.find_window", """
+MATCH (u:User)
+WHERE u.created_at >= $since AND u.created_at < $until
+RETURN collect(properties(u)) AS users
+""")
+
+USER_FIND_BY_ID = register("user.find_by_id", "MATCH (u:User {id: $id}) RETURN properties(u) AS user")
+
+USER_UPDATE = register("user.update", """
+MATCH (u:User {id: $id})
+SET u.name = coalesce($name, u.name), u.email = coalesce($email, u.email)
+RETURN properties(u) AS user
+""")
+
+USER_DELETE = register("user.delete", """
+MATCH (u:User {id: $id})
+OPTIONAL MATCH (u)-[:FRIENDS_WITH]-(f:User)
+SET f.friend_count = f.friend_count - 1
+WITH DISTINCT u
+OPTIONAL MATCH (u)-[:CREATED]->(n)
+WHERE n:Post OR n:Comment
+WITH u, collect(n) AS created
+FOREACH (n IN created | DETACH DELETE n)
+DETACH DELETE u
+""")
+
+# Supernœuds : suppression par lots des relations, puis des posts et
+# commentaires créés, avant celle du nœud lui-même
+USER_DELETE_RELATIONSHIPS_PAGE = register("user.delete_relationships_page", """
+MATCH (u:User {id: $id})-[r:FRIENDS_WITH|LIKES]-(n)
+WITH r, n LIMIT $limit
+FOREACH (_ IN CASE WHEN type(r) = "FRIENDS_WITH" THEN [1] ELSE [] END |
+    SET n.friend_count = n.friend_count - 1)
+DELETE r
+RETURN count(r) AS deleted
+""")
+
+USER_DELETE_CREATED_PAGE = register("user.delete_created_page", """
+MATCH (u:User {id: $id})-[:CREATED]->(n)
+WHERE n:Post OR n:Comment
+WITH n LIMIT $limit
+DETACH DELETE n
+RETURN count(n) AS deleted
+""")
+
+USER_DELETE_NODE = register("user.delete_node", "MATCH (u:User {id: $id}) DETACH DELETE u")
+
+# Une amitié est une seule relation, orientée du plus petit id ($low_id)
+# vers le plus grand ($high_id). Tant que `flask migrate-friendships` n'a pas
+# tourné, une relation dans l'autre sens peut exister : elle compte aussi.
+# Les deux utilisateurs sont marqués pour `flask communities --incremental`
+USER_ADD_FRIEND = register("user.add_friend", """
+MATCH (a:User {id: $low_id}), (b:User {id: $high_id})
+WITH a, b, EXISTS { (b)-[:FRIENDS_WITH]->(a) } AS reversed
+FOREACH (_ IN CASE WHEN reversed THEN [] ELSE [1] END |
+    MERGE (a)-[:FRIENDS_WITH]->(b)
+    ON CREATE SET a.friend_count = coalesce(a.friend_count, 0) + 1,
+                  b.friend_count = coalesce(b.friend_count, 0) + 1)
+SET a.community_stale = true, b.community_stale = true
+RETURN a, b
+""")
+
+USER_REMOVE_FRIEND = register("user.remove_friend", """
+MATCH (a:User {id: $low_id})-[r:FRIENDS_WITH]-(b:User {id: $high_id})
+WITH a, b, collect(r) AS rels
+FOREACH (r IN rels | DELETE r)
+SET a.friend_count = a.friend_count - size(rels), b.friend_count = b.friend_count - size(rels),
+    a.community_stale = true, b.community_stale = true
+""")
+
+# Une page d'amis triés par id, après l'id $after
+USER_GET_FRIENDS = register("user.get_friends", """
+MATCH (u:User {id: $user_id})-[:FRIENDS_WITH]-(f:User)
+WHERE $after IS NULL OR f.id > $after
+WITH DISTINCT f ORDER BY f.id LIMIT $limit
+RETURN collect(properties(f)) AS friends
+""")
+
+USER_ARE_FRIENDS = register("user.are_friends", """
+MATCH (a:User {id: $low_id}), (b:User {id: $high_id})
+RETURN EXISTS { (a)-[:FRIENDS_WITH]-(b) } AS are_friends
+""")
+
+# L'expansion part de l'utilisateur qui a le moins d'amis ; le lien vers
+# l'autre n'est que vérifié (Expand(Into)), sans parcourir ses amis
+USER_MUTUAL_FRIENDS = register("user.mutual_friends", """
+MATCH (u:User {id: $user_id}), (other:User {id: $other_id})
+WITH CASE WHEN coalesce(u.friend_count, COUNT { (u)-[:FRIENDS_WITH]-() })
+               <= coalesce(other.friend_count, COUNT { (other)-[:FRIENDS_WITH]-() })
+          THEN [u, other] ELSE [other, u] END AS ends
+WITH ends[0] AS low, ends[1] AS high
+MATCH (low)-[:FRIENDS_WITH]-(mutual:User)
+WHERE (mutual)-[:FRIENDS_WITH]-(high)
+WITH DISTINCT mutual LIMIT $limit
+RETURN collect(properties(mutual)) AS mutual_friends
+""")
+
+# Utilisateurs de plus haut degré, par nombre d'amis ou de posts
+USER_TOP_FRIEND_COUNT = register("user.top_friend_count", """
+MATCH (u:User) WHERE u.friend_count IS NOT NULL
+WITH u ORDER BY u.friend_count DESC LIMIT $limit
+RETURN collect({id: u.id, name: u.name, friend_count: u.friend_count,
+                post_count: u.post_count}) AS users
+""")
+
+USER_TOP_POST_COUNT = register("user.top_post_count", """
+MATCH (u:User) WHERE u.post_count IS NOT NULL
+WITH u ORDER BY u.post_count DESC LIMIT $limit
+RETURN collect({id: u.id, name: u.name, friend_count: u.friend_count,
+                post_count: u.post_count}) AS users
+""")
+
+# Quels posts et commentaires l'utilisateur a aimés, et de qui il est ami,
+# parmi des listes d'ids : chaque id est cherché dans l'index puis relié à
+# l'utilisateur (Expand(Into)), sans parcourir toutes ses relations
+USER_CHECK_RELATIONS = register("user.check_relations", """
+MATCH (v:User {id: $user_id})
+CALL {
+    WITH v
+    UNWIND $post_ids AS id
+    MATCH (v)-[:LIKES]->(:Post {id: id})
+    RETURN collect(DISTINCT id) AS liked_posts
+}
+CALL {
+    WITH v
+    UNWIND $comment_ids AS id
+    MATCH (v)-[:LIKES]->(:Comment {id: id})
+    RETURN collect(DISTINCT id) AS liked_comments
+}
+CALL {
+    WITH v
+    UNWIND $user_ids AS id
+    MATCH (v)-[:FRIENDS_WITH]-(:User {id: id})
+    RETURN collect(DISTINCT id) AS friends
+}
+RETURN {posts: liked_posts, comments: liked_comments, users: friends} AS relations
+""")
+
+USER_COMMUNITY = register("user.community", """
+MATCH (u:User {id: $id})
+OPTIONAL MATCH (m:User {community: u.community})
+WITH u, count(m) AS size
+RETURN {community: u.community, size: size} AS community
+""")
+
+
+# Posts
+POST_CREATE = register("post.create", """
+MATCH (u:User {id: $user_id})
+CREATE (u)-[:CREATED]->(p:Post $props)
+SET u.post_count = coalesce(u.post_count, 0) + 1
+RETURN p.id
+""")
+
+POST_CREATE_MANY = register("post.create_many", """
+UNWIND range(0, size($id) - 1) AS i
+MATCH (u:User {id: $user_id[i]})
+CREATE (u)-[:CREATED]->(:Post {id: $id[i], title: $title[i],
+                               content: $content[i], created_at: $created_at[i]})
+SET u.post_count = coalesce(u.post_count, 0) + 1
+""")
+
+POST_FIND_ALL = register("post.find_all", "MATCH (p:Post) RETURN collect(properties(p)) AS posts")
+
+# Pagination par clé : les ids ULID sont triés par date de création
+# $before vaut ids.MAX_ID pour la première page : un prédicat simple sur
+# p.id, que le planificateur résout par un parcours de l'index dans l'ordre
+POST_FIND_LATEST = register("post.find_latest", """
+MATCH (p:Post)
+WHERE p.id < $before
+WITH p ORDER BY p.id DESC LIMIT $limit
+RETURN collect(properties(p)) AS posts
+""")
+
+# Fenêtre de temps : parcours de l'index post_created_at entre $since et $until
+POST_FIND_WINDOW = register("post.find_window", """
+MATCH (p:Post)
+WHERE p.created_at >= $since AND p.created_at < $until
+  AND ($before IS NULL OR p.id < $before)
+WITH p ORDER BY p.id DESC
+RETURN collect(properties(p)) AS posts
+""")
+
+# Même fenêtre, limitée aux $limit posts les plus récents (avant l'id $before)
+POST_FIND_WINDOW_LATEST = register("post.find_window_latest", """
+MATCH (p:Post)
+WHERE p.created_at >= $since AND p.created_at < $until
+  AND ($before IS NULL OR p.id < $before)
+WITH p ORDER BY p.id DESC LIMIT $limit
+RETURN collect(properties(p)) AS posts
+""")
+
+POST_FIND_BY_ID = register("post.find_by_id", "MATCH (p:Post {id: $id}) RETURN properties(p) AS post")
+
+# Parties optionnelles de GET /posts/<id>?include=..., ajoutées à la
+# projection du post
+POST_INCLUDES = {
+    "author": "author: [(a:User)-[:CREATED]->(p) | properties(a)][0]",
+    "comments": """comments: COLLECT {
+        MATCH (p)-[:HAS_COMMENT]->(c:Comment)
+        WITH c ORDER BY c.id DESC LIMIT $comments_limit
+        RETURN properties(c)
+    }""",
+    "comment_count": "comment_count: COUNT { (p)-[:HAS_COMMENT]->(:Comment) }",
+    "like_count": "like_count: COUNT { (p)<-[:LIKES]-(:User) }",
+    "viewer_liked": "viewer_liked: EXISTS { (p)<-[:LIKES]-(:User {id: $viewer}) }",
+}
+
+@lru_cache(maxsize=None)
+def post_detail(includes, fields=()):
+    """
+    Build (and register) the query fetching a post with the given parts,
+    in a single statement.
+    :param includes: Names from POST_INCLUDES, in a canonical order so that
+                     each combination is planned once.
+    :param fields: The post properties to return, from FIELDS["Post"] (default: all).
+    :return: The Cypher statement.
+    """
+    for include in includes:
+        if include not in POST_INCLUDES:
+            raise ValueError(f"Unknown include {include}")
+    _check_fields("Post", fields)
+    properties = ["." + field for field in fields] or [".*"]
+    projection = ",\n    ".join(properties + [POST_INCLUDES[include] for include in includes])
+    cypher = f"MATCH (p:Post {{id: $id}})\nRETURN p {{\n    {projection}\n}} AS post"
+    name = ".".join(("post.detail",) + includes)
+    return register(f"{name}[{','.join(fields)}]" if fields else name, cypher)
+
+# L'écran d'un post demande tout
+# (mêmes arguments que Post.find_detail : lru_cache distingue post_detail(x)
+# de post_detail(x, ()))
+post_detail(tuple(sorted(POST_INCLUDES)), ())
+
+POST_FIND_BY_USER = register("post.find_by_user", """
+MATCH (u:User {id: $user_id})-[:CREATED]->(p:Post)
+RETURN collect(properties(p)) AS posts
+""")
+
+POST_FIND_BY_USER_WINDOW = register("post.find_by_user_window", """
+MATCH (u:User {id: $user_id})-[:CREATED]->(p:Post)
+WHERE p.created_at >= $since AND p.created_at < $until
+RETURN collect(properties(p)) AS posts
+""")
+
+POST_UPDATE = register("post.update", """
+MATCH (p:Post {id: $id})
+SET p.title = coalesce($title, p.title), p.content = coalesce($content, p.content)
+RETURN properties(p) AS post
+""")
+
+POST_DELETE = register("post.delete", """
+MATCH (p:Post {id: $id})
+OPTIONAL MATCH (u:User)-[:CREATED]->(p)
+SET u.post_count = u.post_count - 1
+DETACH DELETE p
+""")
+
+POST_ADD_LIKE = register("post.add_like", """
+MATCH (u:User {id: $user_id}), (p:Post {id: $post_id})
+MERGE (u)-[r:LIKES]->(p)
+RETURN u, p
+""")
+
+POST_REMOVE_LIKE = register("post.remove_like", """
+MATCH (u:User {id: $user_id})-[r:LIKES]->(p:Post {id: $post_id})
+DELETE r
+""")
+
+
+# Comments
+COMMENT_CREATE = register("comment.create", """
+OPTIONAL MATCH (u:User {id: $user_id})
+OPTIONAL MATCH (p:Post {id: $post_id})
+FOREACH (_ IN CASE WHEN u IS NULL OR p IS NULL THEN [] ELSE [1] END |
+    CREATE (u)-[:CREATED]->(:Comment $props)<-[:HAS_COMMENT]-(p))
+RETURN [u IS NOT NULL, p IS NOT NULL]
+""")
+
+COMMENT_CREATE_MANY = register("comment.create_many", """
+UNWIND range(0, size($id) - 1) AS i
+MATCH (u:User {id: $user_id[i]}), (p:Post {id: $post_id[i]})
+CREATE (c:Comment {id: $id[i], content: $content[i], created_at: $created_at[i]})
+CREATE (u)-[:CREATED]->(c)
+CREATE (p)-[:HAS_COMMENT]->(c)
+""")
+
+COMMENT_FIND_ALL = register("comment.find_all", "MATCH (c:Comment) RETURN collect(properties(c)) AS comments")
+
+COMMENT_FIND_WINDOW = register("comment.find_window", """
+MATCH (c:Comment)
+WHERE c.created_at >= $since AND c.created_at < $until
+RETURN collect(properties(c)) AS comments
+""")
+
+COMMENT_FIND_BY_ID = register("comment.find_by_id", "MATCH (c:Comment {id: $id}) RETURN properties(c) AS comment")
+
+COMMENT_FIND_BY_POST = register("comment.find_by_post", """
+MATCH (p:Post {id: $post_id})-[:HAS_COMMENT]->(c:Comment)
+RETURN collect(properties(c)) AS comments
+""")
+
+COMMENT_FIND_BY_POST_WINDOW = register("comment.find_by_post_window", """
+MATCH (p:Post {id: $post_id})-[:HAS_COMMENT]->(c:Comment)
+WHERE c.created_at >= $since AND c.created_at < $until
+RETURN collect(properties(c)) AS comments
+""")
+
+COMMENT_UPDATE = register("comment.update", """
+MATCH (c:Comment {id: $id})
+SET c.content = coalesce($content, c.content)
+RETURN properties(c) AS comment
+""")
+
+COMMENT_DELETE = register("comment.delete", "MATCH (c:Comment {id: $id}) DETACH DELETE c")
+
+COMMENT_ADD_LIKE = register("comment.add_like", """
+MATCH (u:User {id: $user_id}), (c:Comment {id: $comment_id})
+MERGE (u)-[r:LIKES]->(c)
+RETURN u, c
+""")
+
+COMMENT_REMOVE_LIKE = register("comment.remove_like", """
+MATCH (u:User {id: $user_id})-[r:LIKES]->(c:Comment {id: $comment_id})
+DELETE r
+""")
+
+
+# Analytics
+# Page d'utilisateurs (pagination par id) avec leurs arêtes sortantes :
+# amitiés, et auteurs des posts et commentaires qu'ils ont aimés
+USER_EDGES_PAGE = register("analytics.user_edges_page", """
+MATCH (u:User) WHERE u.id > $after
+WITH u ORDER BY u.id LIMIT $limit
+RETURN u.id AS id,
+       [(u)-[:FRIENDS_WITH]-(f:User) | f.id] AS friends,
+       [(u)-[:LIKES]->()<-[:CREATED]-(a:User) | a.id] AS liked
+""")
+
+USER_FRIENDS_PAGE = register("analytics.user_friends_page", """
+MATCH (u:User) WHERE u.id > $after
+WITH u ORDER BY u.id LIMIT $limit
+RETURN u.id AS id, [(u)-[:FRIENDS_WITH]-(f:User) | f.id] AS friends
+""")
+
+# Utilisateurs dont les amitiés ont changé depuis le dernier calcul, avec la
+# communauté actuelle de chacun de leurs amis
+USER_STALE_COMMUNITY = register("analytics.stale_community", """
+MATCH (u:User) WHERE u.community_stale = true
+WITH u LIMIT $limit
+RETURN collect([u.id, [(u)-[:FRIENDS_WITH]-(f:User) | [f.id, f.community]]]) AS rows
+""")
+
+USER_SET_COMMUNITY = register("analytics.set_community", """
+UNWIND range(0, size($id) - 1) AS i
+MATCH (u:User {id: $id[i]})
+SET u.community = $community[i]
+REMOVE u.community_stale
+""")
+
+USER_SET_PAGERANK = register("analytics.set_pagerank", """
+UNWIND range(0, size($id) - 1) AS i
+MATCH (u:User {id: $id[i]})
+SET u.pagerank = $pagerank[i]
+""")
+
+
+# Filtre d'existence (existence.py), construit au démarrage
+EXISTENCE_COUNT = register("existence.count", """
+RETURN COUNT { (:User) } * 2 + COUNT { (:Post) } + COUNT { (:Comment) } AS keys
+""")
+
+def _existence_ids(label):
+    # Pagination par id ; pour les utilisateurs, l'email accompagne l'id
+    value = "[n.id, n.email]" if label == "User" else "n.id"
+    return register(f"existence.{label.lower()}.ids", f"""
+MATCH (n:{label}) WHERE n.id > $after
+WITH n ORDER BY n.id LIMIT $limit
+RETURN collect({value}) AS ids
+""")
+
+EXISTENCE_IDS = {label: _existence_ids(label) for label in ("User", "Post", "Comment")}
+
+
+# Migrations
+# Les migrations parcourent chaque label page par page (pagination par id),
+# au lieu de reprendre le label depuis le début à chaque lot
+def _legacy_ids(label):
+    # Les UUID4 font 36 caractères, les ULID 26
+    return register(f"migration.{label.lower()}.legacy_ids", f"""
+MATCH (n:{label}) WHERE n.id > $after
+WITH n ORDER BY n.id LIMIT $limit
+WITH collect(n) AS nodes
+RETURN {{last_id: last(nodes).id, count: size(nodes),
+        rows: [n IN nodes WHERE size(n.id) = 36 | [n.id, n.created_at]]}} AS page
+""")
+
+def _rekey(label):
+    return register(f"migration.{label.lower()}.rekey", f"""
+UNWIND range(0, size($id) - 1) AS i
+MATCH (n:{label} {{id: $id[i]}})
+SET n.legacy_id = n.id, n.id = $new_id[i]
+""")
+
+def _float_created_at(label):
+    # Anciennes dates : secondes flottantes, converties en DateTime UTC
+    return register(f"migration.{label.lower()}.float_created_at", f"""
+MATCH (n:{label}) WHERE n.id > $after
+WITH n ORDER BY n.id LIMIT $limit
+WITH collect(n) AS nodes
+WITH nodes, [n IN nodes WHERE toFloatOrNull(n.created_at) IS NOT NULL] AS floats
+FOREACH (n IN floats |
+    SET n.created_at = datetime({{epochMillis: toInteger(round(n.created_at * 1000))}}))
+RETURN {{last_id: last(nodes).id, count: size(nodes), converted: size(floats)}} AS page
+""")
+
+# Recalcul des degrés, page d'utilisateurs par page (pagination par id)
+USER_DEGREE_COUNTS_PAGE = register("migration.user.degree_counts", """
+MATCH (u:User) WHERE u.id > $after
+WITH u ORDER BY u.id LIMIT $limit
+SET u.friend_count = COUNT { (u)-[:FRIENDS_WITH]-(:User) },
+    u.post_count = COUNT { (u)-[:CREATED]->(:Post) }
+RETURN {last_id: last(collect(u.id)), count: count(u)} AS page
+""")
+
+# Regroupe les amitiés en double (deux sens, ou plusieurs relations) en une
+# seule relation orientée du plus petit id vers le plus grand. Chaque paire
+# est traitée depuis son plus petit id, page d'utilisateurs par page.
+FRIENDSHIP_CANONICAL_PAGE = register("migration.friendship.canonical", """
+MATCH (u:User) WHERE u.id > $after
+WITH u ORDER BY u.id LIMIT $limit
+CALL {
+    WITH u
+    MATCH (u)-[r:FRIENDS_WITH]-(f:User)
+    WHERE u.id < f.id
+    WITH u, f, collect(r) AS rels
+    WITH u, f, rels, [r IN rels WHERE startNode(r) = u] AS canonical
+    WHERE size(rels) > 1 OR size(canonical) = 0
+    FOREACH (r IN [r IN rels WHERE size(canonical) = 0 OR r <> canonical[0]] | DELETE r)
+    FOREACH (_ IN CASE WHEN size(canonical) = 0 THEN [1] ELSE [] END |
+        CREATE (u)-[:FRIENDS_WITH]->(f))
+    RETURN count(*) AS fixed
+}
+RETURN {last_id: last(collect(u.id)), count: count(u), fixed: sum(fixed)} AS page
+""")
+
+# Nombre de relations FRIENDS_WITH et de paires d'amis distinctes
+FRIENDSHIP_EDGES = register("migration.friendship.edges", """
+MATCH (u:User)-[r:FRIENDS_WITH]->(f:User)
+RETURN {relationships: count(r),
+        pairs: count(DISTINCT CASE WHEN u.id < f.id THEN [u.id, f.id] ELSE [f.id, u.id] END)}
+       AS edges
+""")
+
+def _legacy_remap(label):
+    # Ancien UUID4 (legacy_id, indexé) -> id actuel
+    return register(f"migration.{label.lower()}.legacy_remap",
+                    f"MATCH (n:{label} {{legacy_id: $legacy_id}}) RETURN n.id AS id")
+
+def _id_sizes(label):
+    return register(f"bench.{label.lower()}.id_sizes", f"""
+MATCH (n:{label})
+RETURN {{nodes: count(n), legacy: count(n.legacy_id), id_bytes: sum(size(n.id))}} AS sizes
+""")
+
+# Même page que post.find_latest, triée par created_at au lieu de l'id
+# ($before : une date, models.LATEST pour la première page)
+POST_LATEST_BY_CREATED_AT = register("bench.post.latest_by_created_at", """
+MATCH (p:Post)
+WHERE p.created_at < $before
+WITH p ORDER BY p.created_at DESC LIMIT $limit
+RETURN collect(properties(p)) AS posts
+""", {"before": SAMPLE_VALUES["until"], "limit": 1})
+
+# Suppression des utilisateurs (et de leurs posts) créés par bench-save-many
+BENCH_DELETE_USERS = register("bench.user.delete_many", """
+UNWIND range(0, size($id) - 1) AS i
+MATCH (u:User {id: $id[i]})
+OPTIONAL MATCH (u)-[:CREATED]->(p:Post)
+DETACH DELETE p, u
+""")
+
+LEGACY_IDS = {label: _legacy_ids(label) for label in ("User", "Post", "Comment")}
+LEGACY_REMAP = {label: _legacy_remap(label) for label in ("User", "Post", "Comment")}
+ID_SIZES = {label: _id_sizes(label) for label in ("User", "Post", "Comment")}
+REKEY = {label: _rekey(label) for label in ("User", "Post", "Comment")}
+FLOAT_CREATED_AT = {label: _float_created_at(label) for label in ("User", "Post", "Comment")}
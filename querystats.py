@@ -0,0 +1,79 @@
+from functools import lru_cache
+from threading import Lock
+
+# Statistiques cumulées par empreinte de requête
+_lexer = None
+_lock = Lock()
+_stats = {}
+
+@lru_cache(maxsize=1024)
+def fingerprint(query):
+    """
+    Normalise a Cypher statement so that variants of the same query share a key.
+    Literals become "?", comments are dropped and whitespace is only kept
+    where it separates two words.
+    :param query: The Cypher statement.
+    :return: The normalised statement.
+    """
+    global _lexer
+    # Le lexer (pygments) n'est importé qu'à la première requête
+    from pygments.token import Comment, Number, String, Whitespace
+    if _lexer is None:
+        from py2neo.cypher.lexer import CypherLexer
+        _lexer = CypherLexer()
+    parts = []
+    spaced = False
+    for token_type, value in _lexer.get_tokens(query):
+        if token_type in Comment:
+            continue
+        if token_type in Whitespace:
+            spaced = True
+            continue
+        if token_type in String or token_type in Number:
+            value = "?"
+        # Un espace n'est conservé qu'entre deux mots
+        if spaced and parts and _is_word(parts[-1][-1]) and _is_word(value[0]):
+            parts.append(" ")
+        parts.append(value)
+        spaced = False
+    return "".join(parts)
+
+def _is_word(char):
+    return char.isalnum() or char in "_$?`"
+
+def record(query, elapsed, rows=0, counters=None):
+    """
+    Add one execution of a statement to its fingerprint's statistics.
+    :param query: The Cypher statement that was run.
+    :param elapsed: The execution time, in seconds.
+    :param rows: The number of rows returned.
+    :param counters: The update counters from Cursor.stats().
+    """
+    key = fingerprint(query)
+    with _lock:
+        entry = _stats.get(key)
+        if entry is None:
+            entry = _stats[key] = {"query": key, "calls": 0, "total_ms": 0.0,
+                                   "max_ms": 0.0, "rows": 0, "updates": 0}
+        elapsed_ms = elapsed * 1000
+        entry["calls"] += 1
+        entry["total_ms"] += elapsed_ms
+        entry["max_ms"] = max(entry["max_ms"], elapsed_ms)
+        entry["rows"] += rows
+        for value in (counters or {}).values():
+            if isinstance(value, int) and not isinstance(value, bool):
+                entry["updates"] += value
+
+def snapshot():
+    """
+    Return the statistics of every fingerprint, sorted by total time.
+    """
+    with _lock:
+        entries = [dict(entry) for entry in _stats.values()]
+    for entry in entries:
+        entry["mean_ms"] = entry["total_ms"] / entry["calls"]
+    return sorted(entries, key=lambda entry: entry["total_ms"], reverse=True)
+
+def reset():
+    with _lock:
+        _stats.clear()
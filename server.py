@@ -0,0 +1,157 @@
+"""
+Serveur de production multi-processus (prefork).
+
+Le processus maître ouvre le socket d'écoute puis lance N workers par fork.
+Chaque worker crée sa propre application, donc sa propre connexion Neo4j
+préchauffée, et sert les requêtes avec plusieurs threads. Un worker est
+recyclé après un nombre de requêtes ou une mémoire maximale. SIGTERM (ou
+SIGINT) termine les requêtes en cours et ferme les connexions Neo4j avant
+de quitter.
+
+Le filtre d'existence (existence.py) est construit par le maître avant le
+fork, dans une mémoire partagée par tous les workers. Il ne voit pas les
+écritures des autres processus : FLASK_EXISTENCE_FILTER=false le désactive
+si des scripts ou d'autres serveurs écrivent dans la même base.
+
+    python server.py --port 5000 --workers 4 --max-requests 10000
+"""
+import argparse
+import os
+import resource
+import signal
+import socket
+import sys
+import threading
+import time
+import traceback
+
+from werkzeug.serving import make_server
+
+# Importés avant le fork : les workers partagent ces modules sans les recharger
+from app import create_app, load_config
+from models import build_existence_filter, close_graph
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run the API with preforked workers.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="number of worker processes (default: CPU count)")
+    parser.add_argument("--max-requests", type=int, default=0,
+                        help="recycle a worker after this many requests (0: never)")
+    parser.add_argument("--max-memory-mb", type=int, default=0,
+                        help="recycle a worker above this peak memory (0: never)")
+    return parser.parse_args(argv)
+
+def peak_memory_mb():
+    # ru_maxrss est exprimé en kilo-octets sous Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def run_worker(sock, args):
+    """
+    Serve requests on the shared socket until recycled or asked to stop.
+    """
+    stopping = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stopping.set())
+    signal.signal(signal.SIGINT, lambda signum, frame: stopping.set())
+
+    # La fabrique ouvre la connexion Neo4j de ce processus et la préchauffe
+    app = create_app()
+    served = 0
+    lock = threading.Lock()
+
+    def counting_app(environ, start_response):
+        nonlocal served
+        try:
+            return app(environ, start_response)
+        finally:
+            with lock:
+                served += 1
+                if args.max_requests and served >= args.max_requests:
+                    stopping.set()
+            if args.max_memory_mb and peak_memory_mb() > args.max_memory_mb:
+                stopping.set()
+
+    server = make_server(args.host, args.port, counting_app, threaded=True, fd=sock.fileno())
+    # Threads non démons : server_close() attend les requêtes en cours
+    server.daemon_threads = False
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    stopping.wait()
+
+    server.shutdown()
+    server.server_close()
+    close_graph()
+    app.logger.warning("Worker %d stopped after %d requests (peak %.0f MB)",
+                       os.getpid(), served, peak_memory_mb())
+
+def spawn(sock, args):
+    pid = os.fork()
+    if pid == 0:
+        # Pas le gestionnaire du maître, qui tuerait les autres workers
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        code = 0
+        try:
+            run_worker(sock, args)
+        except BaseException:
+            traceback.print_exc()
+            code = 1
+        finally:
+            os._exit(code)
+    return pid
+
+def main(argv=None):
+    args = parse_args(argv)
+    sock = socket.create_server((args.host, args.port), backlog=128)
+    print(f"Listening on http://{args.host}:{args.port} with {args.workers} workers",
+          file=sys.stderr)
+
+    workers = set()
+    shutting_down = False
+
+    def shutdown(signum, frame):
+        nonlocal shutting_down
+        shutting_down = True
+        for pid in workers:
+            os.kill(pid, signal.SIGTERM)
+
+    def start_worker():
+        # Un signal peut arriver pendant la construction du filtre ou entre
+        # le fork et l'ajout à workers : aucun worker ne doit lui survivre
+        if shutting_down:
+            return
+        pid = spawn(sock, args)
+        workers.add(pid)
+        if shutting_down:
+            os.kill(pid, signal.SIGTERM)
+
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+
+    # Le filtre d'existence, actif par défaut ici (FLASK_EXISTENCE_FILTER=false
+    # le désactive), est construit une seule fois, en mémoire partagée :
+    # chaque worker voit les ids créés par les autres
+    if load_config(defaults={"EXISTENCE_FILTER": True})["EXISTENCE_FILTER"]:
+        build_existence_filter()
+        close_graph()
+
+    for _ in range(args.workers):
+        start_worker()
+
+    # Remplace chaque worker qui se termine, sauf pendant l'arrêt
+    while workers:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        workers.discard(pid)
+        if not shutting_down:
+            if status != 0:
+                # Évite de relancer en boucle un worker qui échoue au démarrage
+                time.sleep(1)
+            start_worker()
+    sock.close()
+
+if __name__ == "__main__":
+    main()
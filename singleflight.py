@@ -0,0 +1,133 @@
+"""
+Regroupement des lectures identiques simultanées (single-flight).
+
+Quand plusieurs threads demandent la même lecture (même méthode, mêmes
+arguments) en même temps, un seul exécute la requête Cypher ; les autres
+attendent son résultat, au plus WAIT_TIMEOUT secondes, puis l'exécutent
+eux-mêmes. Le résultat est partagé : les appelants ne doivent pas le modifier.
+
+Une lecture commencée avant une écriture peut renvoyer l'état précédent à
+un appelant arrivé juste après l'écriture, comme si sa requête était partie
+un peu plus tôt.
+"""
+from collections import OrderedDict
+from concurrent.futures import Future
+from functools import wraps
+from threading import Lock
+import asyncio
+
+# Attente maximale du résultat d'un autre appelant, en secondes
+WAIT_TIMEOUT = 2.0
+
+# Nombre de clés suivies par les statistiques (les plus récentes)
+MAX_STATS_KEYS = 1000
+
+_lock = Lock()
+_calls = {}
+_stats = OrderedDict()
+
+def _count(key, counter):
+    # Appelé avec _lock acquis
+    entry = _stats.get(key)
+    if entry is None:
+        entry = _stats[key] = {"key": key, "calls": 0, "queries": 0, "shared": 0, "timeouts": 0}
+        if len(_stats) > MAX_STATS_KEYS:
+            _stats.popitem(last=False)
+    else:
+        _stats.move_to_end(key)
+    entry[counter] += 1
+
+def _join(key):
+    # Renvoie le Future de l'appel en cours pour key, et True si l'appelant
+    # doit l'exécuter lui-même
+    with _lock:
+        _count(key, "calls")
+        future = _calls.get(key)
+        if future is not None:
+            _count(key, "shared")
+            return future, False
+        future = _calls[key] = Future()
+        _count(key, "queries")
+        return future, True
+
+def _lead(key, future, fn):
+    try:
+        result = fn()
+    except BaseException as e:
+        future.set_exception(e)
+        raise
+    else:
+        future.set_result(result)
+        return result
+    finally:
+        with _lock:
+            _calls.pop(key, None)
+
+def _timed_out(key):
+    with _lock:
+        _count(key, "timeouts")
+        _count(key, "queries")
+
+def do(key, fn, timeout=None):
+    """
+    Call fn, or wait for the result of a concurrent call with the same key.
+    :param key: A hashable key identifying the read.
+    :param fn: A function without arguments performing the read.
+    :param timeout: The maximum wait for another caller's result, in seconds
+                    (default: WAIT_TIMEOUT).
+    :return: The result of fn.
+    """
+    timeout = WAIT_TIMEOUT if timeout is None else timeout
+    future, leader = _join(key)
+    if leader:
+        return _lead(key, future, fn)
+    try:
+        return future.result(timeout)
+    except TimeoutError:
+        _timed_out(key)
+        return fn()
+
+async def do_async(key, fn, timeout=None):
+    """
+    Same as do() for asyncio code: fn, which blocks, runs in a thread, and
+    waiting for a concurrent call does not block the event loop. Sync and
+    async callers share the same in-flight calls.
+    """
+    timeout = WAIT_TIMEOUT if timeout is None else timeout
+    future, leader = _join(key)
+    if leader:
+        return await asyncio.to_thread(_lead, key, future, fn)
+    try:
+        # shield : l'expiration de l'attente ne doit pas annuler le Future
+        # partagé, que le meneur et les autres appelants attendent encore
+        return await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), timeout)
+    except TimeoutError:
+        _timed_out(key)
+        return await asyncio.to_thread(fn)
+
+def coalesced(method):
+    """
+    Decorate a read so that identical concurrent calls share one execution.
+    The key is the qualified name of the function and the repr of its arguments.
+    """
+    name = method.__qualname__
+
+    @wraps(method)
+    def wrapper(*args, **kwargs):
+        key = (name, repr(args), repr(sorted(kwargs.items())))
+        return do(key, lambda: method(*args, **kwargs))
+    return wrapper
+
+def snapshot():
+    """
+    Return the statistics of the most recent keys, most shared first.
+    """
+    with _lock:
+        entries = [dict(entry) for entry in _stats.values()]
+    for entry in entries:
+        entry["key"] = " ".join(entry["key"]) if isinstance(entry["key"], tuple) else str(entry["key"])
+    return sorted(entries, key=lambda entry: entry["shared"], reverse=True)
+
+def reset():
+    with _lock:
+        _stats.clear()
@@ -0,0 +1,53 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import models
+
+class FakeCursor:
+    def __init__(self, value, plan=None):
+        self.value = value
+        self._plan = plan
+
+    def plan(self):
+        return self._plan
+
+    def evaluate(self):
+        return self.value
+
+    def stats(self):
+        return {}
+
+    def data(self):
+        return []
+
+    def __iter__(self):
+        return iter(self.value or [])
+
+class FakeGraph:
+    """
+    Stands in for the py2neo Graph: records each query and answers it with
+    respond(cypher, params).
+    """
+    def __init__(self):
+        self.calls = []
+        self.respond = lambda cypher, params: None
+        self.plan = None
+
+    def run(self, cypher, **params):
+        self.calls.append((cypher, params))
+        return FakeCursor(self.respond(cypher, params), self.plan)
+
+@pytest.fixture
+def graph(monkeypatch):
+    fake = FakeGraph()
+    monkeypatch.setattr(models, "get_graph", lambda: fake)
+    return fake
+
+@pytest.fixture
+def client(graph):
+    from app import create_app
+    return create_app({"WARMUP": False, "EXISTENCE_FILTER": False}).test_client()
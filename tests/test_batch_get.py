@@ -0,0 +1,13 @@
+import pytest
+
+@pytest.mark.parametrize("label", ["users", "posts", "comments"])
+@pytest.mark.parametrize("body", [["a"], "a", 1])
+def test_batch_get_rejects_non_object_bodies(client, label, body):
+    response = client.post(f"/{label}:batchGet", json=body)
+    assert response.status_code == 400
+    assert response.get_json() == {"error": "ids must be a list of ids"}
+
+def test_batch_get_keeps_the_requested_order(client, graph):
+    graph.respond = lambda cypher, params: [["b", {"id": "b"}]]
+    response = client.post("/users:batchGet", json={"ids": ["a", "b"]})
+    assert response.get_json() == [{"id": "a", "missing": True}, {"id": "b"}]
@@ -0,0 +1,12 @@
+import models
+import queries
+
+def test_bench_save_many_cleans_up(graph):
+    reports = models.bench_save_many(rows=5, batch_sizes=(2, 5))
+    assert [report["batch_size"] for report in reports] == [2, 5]
+    created = [params for cypher, params in graph.calls if cypher == queries.USER_CREATE_MANY]
+    deleted = [params for cypher, params in graph.calls if cypher == queries.BENCH_DELETE_USERS]
+    # 5 utilisateurs par lots de 2 (3 requêtes), puis d'un seul lot de 5
+    assert [len(params["id"]) for params in created] == [2, 2, 1, 5]
+    assert sorted(sum((params["id"] for params in created), [])) == \
+        sorted(sum((params["id"] for params in deleted), []))
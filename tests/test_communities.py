@@ -0,0 +1,54 @@
+import analytics
+import queries
+
+def friendships(pairs, isolated=()):
+    # Amitiés dans les deux sens, comme les lit USER_FRIENDS_PAGE
+    graph = analytics.UserGraph()
+    for a, b in pairs:
+        for source, target in ((a, b), (b, a)):
+            graph.sources.append(graph.node(source))
+            graph.targets.append(graph.node(target))
+    for user_id in isolated:
+        graph.node(user_id)
+    return graph
+
+# Deux triangles reliés par une seule amitié, et un utilisateur isolé
+PAIRS = [("a", "b"), ("b", "c"), ("c", "a"), ("d", "e"), ("e", "f"), ("f", "d"), ("c", "d")]
+
+def communities(graph, labels):
+    return {user_id: graph.ids[label] for user_id, label in zip(graph.ids, labels)}
+
+def test_adjacency_groups_edges_by_source():
+    graph = friendships([("a", "b"), ("a", "c")], isolated=["d"])
+    offsets, neighbours = graph.adjacency()
+    assert list(offsets) == [0, 2, 3, 4, 4]
+    assert sorted(neighbours[0:2]) == [1, 2]
+    assert list(neighbours[2:4]) == [0, 0]
+
+def test_one_and_several_workers_agree():
+    graph = friendships(PAIRS, isolated=["g"])
+    single = analytics.label_propagation(graph, workers=1)
+    several = analytics.label_propagation(graph, workers=3)
+    assert list(single) == list(several)
+
+def test_triangles_form_communities():
+    graph = friendships(PAIRS)
+    found = communities(graph, analytics.label_propagation(graph, workers=1))
+    assert found["a"] == found["b"] == found["c"]
+    assert found["d"] == found["e"] == found["f"]
+
+def test_isolated_users_keep_their_own_label():
+    graph = friendships(PAIRS, isolated=["g", "h"])
+    found = communities(graph, analytics.label_propagation(graph, workers=2))
+    assert found["g"] == "g"
+    assert found["h"] == "h"
+
+def test_incremental_relabel_follows_friends(graph):
+    # U1 rejoint la communauté de ses deux amis ; U2, sans ami étiqueté, forme la sienne
+    rows = [["U1", [["F1", "C1"], ["F2", "C1"], ["F3", "C2"]]], ["U2", [["F4", None]]]]
+    pages = [rows, []]
+    graph.respond = lambda cypher, params: pages.pop(0) \
+        if cypher == queries.USER_STALE_COMMUNITY else None
+    assert analytics.relabel_stale_communities(batch_size=10) == 2
+    saved = [params for cypher, params in graph.calls if cypher == queries.USER_SET_COMMUNITY]
+    assert saved == [{"id": ["U1", "U2"], "community": ["C1", "U2"]}]
@@ -0,0 +1,57 @@
+import pytest
+
+import existence
+import models
+import queries
+from app import create_app
+
+class ConstraintError(Exception):
+    code = models.CONSTRAINT_FAILED
+
+@pytest.fixture
+def bloom(monkeypatch):
+    # Filtre vide installé pour le test, retiré ensuite
+    monkeypatch.setattr(existence, "_filter", None)
+    monkeypatch.setattr(existence, "_misses", {})
+    existence.install(existence.BloomFilter(1000), 0)
+    return existence._filter
+
+def test_filter_is_off_by_default(graph):
+    create_app({"WARMUP": False})
+    assert not existence.ready()
+    assert not graph.calls
+
+def test_filter_is_not_built_by_flask_commands(graph, monkeypatch):
+    monkeypatch.setenv("FLASK_RUN_FROM_CLI", "true")
+    create_app({"WARMUP": False, "EXISTENCE_FILTER": True})
+    assert not existence.ready()
+    assert not graph.calls
+
+def test_missing_id_skips_neo4j(client, graph, bloom):
+    assert client.get("/users/U1").status_code == 404
+    assert not graph.calls
+
+def test_known_id_reaches_neo4j(client, graph, bloom):
+    existence.add("User", "U1")
+    graph.respond = lambda cypher, params: {"id": "U1", "name": "Ada"}
+    assert client.get("/users/U1").get_json() == {"id": "U1", "name": "Ada"}
+
+def test_taken_email_unknown_to_the_filter(client, graph, bloom):
+    # Email écrit par un autre processus : la contrainte user_email refuse le doublon
+    def respond(cypher, params):
+        if cypher.startswith("CREATE (u:User"):
+            raise ConstraintError("already exists")
+    graph.respond = respond
+    response = client.post("/users", json={"name": "Ada", "email": "ada@example.com"})
+    assert response.status_code == 400
+    assert "already exists" in response.get_json()["error"]
+
+def test_update_to_a_taken_email(client, graph):
+    def respond(cypher, params):
+        if cypher == queries.USER_UPDATE:
+            raise ConstraintError("already exists")
+        return {"id": "U1"}
+    graph.respond = respond
+    response = client.put("/users/U1", json={"email": "taken@example.com"})
+    assert response.status_code == 400
+    assert "already exists" in response.get_json()["error"]
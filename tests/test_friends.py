@@ -0,0 +1,35 @@
+import models
+import queries
+
+def test_add_friend_uses_canonical_order(graph):
+    models.User.add_friend("b", "a")
+    cypher, params = graph.calls[-1]
+    assert cypher == queries.USER_ADD_FRIEND
+    assert params == {"low_id": "a", "high_id": "b"}
+    # Une relation existante dans l'autre sens ne doit pas être doublée
+    assert "EXISTS { (b)-[:FRIENDS_WITH]->(a) }" in cypher
+
+def test_remove_and_check_use_canonical_order(graph):
+    graph.respond = lambda cypher, params: True
+    models.User.remove_friend("b", "a")
+    assert models.User.are_friends("b", "a")
+    assert [params for _, params in graph.calls] == [{"low_id": "a", "high_id": "b"}] * 2
+
+def test_migrate_friendships_follows_last_id(graph):
+    pages = {
+        queries.FRIENDSHIP_CANONICAL_PAGE: [{"last_id": "U2", "count": 2, "fixed": 1},
+                                            {"last_id": "U3", "count": 1, "fixed": 2},
+                                            {"last_id": None, "count": 0, "fixed": 0}],
+        queries.USER_DEGREE_COUNTS_PAGE: [{"last_id": "U3", "count": 3},
+                                          {"last_id": None, "count": 0}],
+    }
+    graph.respond = lambda cypher, params: pages[cypher].pop(0)
+    assert models.migrate_friendships(batch_size=2) == {"pairs": 3, "users": 3}
+    assert [(cypher, params["after"]) for cypher, params in graph.calls] == [
+        (queries.FRIENDSHIP_CANONICAL_PAGE, ""),
+        (queries.FRIENDSHIP_CANONICAL_PAGE, "U2"),
+        (queries.FRIENDSHIP_CANONICAL_PAGE, "U3"),
+        (queries.USER_DEGREE_COUNTS_PAGE, ""),
+        (queries.USER_DEGREE_COUNTS_PAGE, "U3"),
+    ]
+    assert all(params["limit"] == 2 for _, params in graph.calls)
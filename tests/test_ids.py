@@ -0,0 +1,60 @@
+import ids
+
+LEGACY = "0b5c3d6e-8f2a-4c1b-9d3e-5f6a7b8c9d0e"
+
+def test_ulids_sort_in_creation_order():
+    generated = [ids.ulid() for _ in range(1000)]
+    assert generated == sorted(generated)
+    assert all(len(value) == 26 for value in generated)
+
+def test_ulid_from_timestamp_sorts_by_time():
+    assert ids.ulid(1_000_000) < ids.ulid(1_000_001)
+
+def test_is_legacy():
+    assert ids.is_legacy(LEGACY)
+    assert not ids.is_legacy(ids.ulid())
+    assert not ids.is_legacy("x" * 36)
+
+def test_legacy_id_in_url_is_remapped(client, graph):
+    def respond(cypher, params):
+        if "legacy_id" in cypher:
+            return "01J0000000000000000000USER"
+        if params.get("id") == "01J0000000000000000000USER":
+            return {"id": params["id"]}
+    graph.respond = respond
+    response = client.get(f"/users/{LEGACY}")
+    assert response.get_json() == {"id": "01J0000000000000000000USER"}
+
+def test_current_ids_skip_the_remap(client, graph):
+    client.get(f"/users/{ids.ulid()}")
+    assert not any("legacy_id" in cypher for cypher, _ in graph.calls)
+
+def test_negative_post_limit(client, graph):
+    graph.respond = lambda cypher, params: []
+    assert client.get("/posts?limit=-1").status_code == 200
+    assert graph.calls[-1][1]["limit"] == 0
+
+def test_latest_posts_first_page_uses_the_sentinel(client, graph):
+    graph.respond = lambda cypher, params: []
+    client.get("/posts?limit=20")
+    cypher, params = graph.calls[-1]
+    assert "$before IS NULL" not in cypher
+    assert params["before"] == ids.MAX_ID
+    assert ids.MAX_ID > ids.ulid() and ids.MAX_ID > ids.uuid4()
+
+def test_bench_ids_reports_index_ordered_plans(graph):
+    import models
+    graph.plan = {"operatorType": "ProduceResults@neo4j", "children": [
+        {"operatorType": "NodeIndexSeekByRange@neo4j", "children": []}]}
+
+    def respond(cypher, params):
+        if "id_sizes" in cypher or "id_bytes" in cypher:
+            return {"nodes": 1, "legacy": 0, "id_bytes": 26}
+        return [{"id": "01A", "created_at": models.EARLIEST}] if params["before"] in (
+            ids.MAX_ID, models.LATEST) else []
+    graph.respond = respond
+    report = models.bench_ids(pages=3, repeat=1)
+    assert report["by_id"]["operators"] == ["ProduceResults", "NodeIndexSeekByRange"]
+    assert report["by_id"]["index_ordered"]
+    explained = [params for cypher, params in graph.calls if cypher.startswith("EXPLAIN")]
+    assert [params["before"] for params in explained] == [ids.MAX_ID, models.LATEST]
@@ -0,0 +1,36 @@
+import models
+import queries
+
+def pages(graph, label_pages):
+    # Répond page par page ; "after" doit reprendre au dernier id lu
+    def respond(cypher, params):
+        for label, label_page in label_pages.items():
+            if cypher in (queries.LEGACY_IDS.get(label), queries.FLOAT_CREATED_AT.get(label)):
+                return label_page(params["after"])
+        return None
+    graph.respond = respond
+
+def test_migrate_ids_walks_each_label_once(graph):
+    legacy = "0b5c3d6e-8f2a-4c1b-9d3e-5f6a7b8c9d0e"
+    user_pages = {"": {"last_id": "01A", "count": 1, "rows": []},
+                  "01A": {"last_id": legacy, "count": 1, "rows": [[legacy, 1.5e9]]},
+                  legacy: {"last_id": None, "count": 0, "rows": []}}
+    empty = lambda after: {"last_id": None, "count": 0, "rows": []}
+    pages(graph, {"User": user_pages.get, "Post": empty, "Comment": empty})
+    assert models.migrate_ids(batch_size=1) == {"User": 1, "Post": 0, "Comment": 0}
+    rekeys = [params for cypher, params in graph.calls if cypher == queries.REKEY["User"]]
+    assert rekeys[0]["id"] == [legacy]
+
+def test_migrate_created_at_counts_converted_nodes(graph):
+    user_pages = {"": {"last_id": "01A", "count": 2, "converted": 1},
+                  "01A": {"last_id": None, "count": 0, "converted": 0}}
+    empty = lambda after: {"last_id": None, "count": 0, "converted": 0}
+    pages(graph, {"User": user_pages.get, "Post": empty, "Comment": empty})
+    assert models.migrate_created_at(batch_size=2) == {"User": 1, "Post": 0, "Comment": 0}
+
+def test_window_with_limit_limits_in_cypher(client, graph):
+    graph.respond = lambda cypher, params: []
+    client.get("/posts?since=2024-01-01T00:00:00Z&limit=5")
+    cypher, params = graph.calls[-1]
+    assert cypher == queries.POST_FIND_WINDOW_LATEST
+    assert params["limit"] == 5
@@ -0,0 +1,48 @@
+import pytest
+
+import analytics
+
+def user_graph(edges, isolated=()):
+    graph = analytics.UserGraph()
+    for source, target in edges:
+        graph.sources.append(graph.node(source))
+        graph.targets.append(graph.node(target))
+    for user_id in isolated:
+        graph.node(user_id)
+    return graph
+
+EDGES = [("a", "b"), ("b", "c"), ("c", "a"), ("a", "c"), ("d", "c")]
+
+@pytest.fixture
+def without_numpy(monkeypatch):
+    monkeypatch.setattr(analytics, "_numpy", lambda: None)
+
+def test_scores_sum_to_one(without_numpy):
+    ranks = analytics.pagerank(user_graph(EDGES, isolated=["e"]))
+    assert sum(ranks) == pytest.approx(1)
+    assert all(rank > 0 for rank in ranks)
+
+def test_cycle_scores_are_equal(without_numpy):
+    ranks = analytics.pagerank(user_graph([("a", "b"), ("b", "c"), ("c", "a")]))
+    assert ranks == pytest.approx([1 / 3] * 3)
+
+def test_most_linked_user_ranks_first(without_numpy):
+    graph = user_graph(EDGES)
+    ranks = analytics.pagerank(graph)
+    assert graph.ids[ranks.index(max(ranks))] == "c"
+
+def test_empty_graph(without_numpy):
+    assert analytics.pagerank(analytics.UserGraph()) == []
+
+def test_numpy_and_array_paths_agree(monkeypatch):
+    pytest.importorskip("numpy")
+    graph = user_graph(EDGES, isolated=["e"])
+    with_numpy = analytics.pagerank(graph)
+    monkeypatch.setattr(analytics, "_numpy", lambda: None)
+    assert analytics.pagerank(graph) == pytest.approx(with_numpy)
+
+def test_save_pagerank_writes_columns(graph):
+    users = user_graph([("a", "b")])
+    analytics.save_pagerank(users, [0.25, 0.75], batch_size=1)
+    assert [params for _, params in graph.calls] == [{"id": ["a"], "pagerank": [0.25]},
+                                                      {"id": ["b"], "pagerank": [0.75]}]
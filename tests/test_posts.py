@@ -0,0 +1,31 @@
+import queries
+
+FULL_POST = {"id": "P1", "title": "Hello", "content": "World", "author": {"id": "U1"},
+             "comments": [], "comment_count": 0, "like_count": 2, "viewer_liked": True}
+
+def test_get_post_with_every_include(client, graph):
+    graph.respond = lambda cypher, params: FULL_POST
+    response = client.get("/posts/P1?include=author,comments,comment_count,like_count,"
+                          "viewer_liked&viewer=U2")
+    assert response.status_code == 200
+    assert response.get_json() == FULL_POST
+    cypher, params = graph.calls[-1]
+    assert cypher == queries.post_detail(tuple(sorted(queries.POST_INCLUDES)), ())
+    assert params["viewer"] == "U2"
+
+def test_get_post_with_some_includes_and_fields(client, graph):
+    graph.respond = lambda cypher, params: {"id": "P1", "like_count": 0}
+    for _ in range(2):
+        response = client.get("/posts/P1?include=like_count&fields=id")
+        assert response.status_code == 200
+    assert response.get_json() == {"id": "P1", "like_count": 0}
+
+def test_get_missing_post(client, graph):
+    response = client.get("/posts/P9?include=author")
+    assert response.status_code == 404
+
+def test_negative_comments_limit(client, graph):
+    graph.respond = lambda cypher, params: {"id": "P1", "comments": []}
+    response = client.get("/posts/P1?include=comments&comments_limit=-1")
+    assert response.status_code == 200
+    assert graph.calls[-1][1]["comments_limit"] == 0
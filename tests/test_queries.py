@@ -0,0 +1,57 @@
+from concurrent.futures import ThreadPoolExecutor
+from threading import Barrier
+import re
+
+import pytest
+
+import queries
+
+def concurrently(fn, threads=8):
+    barrier = Barrier(threads)
+
+    def call(_):
+        barrier.wait()
+        return fn()
+    with ThreadPoolExecutor(threads) as pool:
+        return list(pool.map(call, range(threads)))
+
+def test_register_same_statement_twice():
+    cypher = queries.register("test.same", "RETURN 1")
+    assert queries.register("test.same", "RETURN 1") == cypher
+
+def test_register_other_statement_under_taken_name():
+    queries.register("test.taken", "RETURN 1")
+    with pytest.raises(ValueError):
+        queries.register("test.taken", "RETURN 2")
+
+@pytest.mark.parametrize("build", [
+    lambda: queries.project(queries.USER_FIND_ALL, "User", ("community", "email")),
+    lambda: queries.lookup("Post", "Post", "Comment"),
+    lambda: queries.post_detail(("comment_count", "like_count"), ("id",)),
+])
+def test_concurrent_first_builds(build):
+    results = concurrently(build)
+    assert len(set(results)) == 1
+    assert results[0] in queries.STATEMENTS.values()
+
+def test_project_replaces_properties():
+    cypher = queries.project(queries.USER_FIND_BY_ID, "User", ("id", "name"))
+    assert "u {.id, .name}" in cypher
+    assert "user.find_by_id[id,name]" in queries.STATEMENTS
+
+def test_sample_parameters_types():
+    parameters = queries.PARAMETERS["user.create_many"]
+    assert all(isinstance(value, list) for value in parameters.values())
+    window = queries.PARAMETERS["post.find_window"]
+    assert window["since"].tzinfo is not None
+    assert isinstance(queries.PARAMETERS["post.find_latest"]["limit"], int)
+    assert queries.PARAMETERS["user.find_many"] == {"ids": [""]}
+
+def test_warmup_explains_with_every_parameter(graph):
+    import models
+    report = models.warmup()
+    assert report["failures"] == {}
+    assert len(graph.calls) == len(queries.STATEMENTS)
+    for cypher, params in graph.calls:
+        assert cypher.startswith("EXPLAIN ")
+        assert set(params) == set(re.findall(r"\$(\w+)", cypher))
@@ -0,0 +1,12 @@
+import pytest
+
+@pytest.mark.parametrize("body", [["P1"], "P1", None])
+def test_check_relations_rejects_non_object_bodies(client, body):
+    response = client.post("/users/U1/relations:check", json=body)
+    assert response.status_code == 400
+    assert response.get_json() == {"error": "posts, comments and users must be lists of ids"}
+
+def test_check_relations(client, graph):
+    graph.respond = lambda cypher, params: {"posts": ["P1"], "comments": [], "users": []}
+    response = client.post("/users/U1/relations:check", json={"posts": ["P1", "P2"]})
+    assert response.get_json() == {"posts": {"P1": True, "P2": False}, "comments": {}, "users": {}}
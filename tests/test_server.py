@@ -0,0 +1,56 @@
+import os
+import signal
+
+import pytest
+
+import server
+
+@pytest.fixture
+def master(monkeypatch):
+    # Le maître sans fork : spawn renvoie un faux pid, os.wait le termine
+    spawned, killed, exited = [], [], []
+    real_kill = os.kill
+
+    def spawn(sock, args):
+        spawned.append(len(spawned) + 100000)
+        return spawned[-1]
+
+    def kill(pid, signum):
+        if pid == os.getpid():
+            return real_kill(pid, signum)
+        killed.append(pid)
+        exited.append(pid)
+
+    def wait():
+        if not exited:
+            raise ChildProcessError
+        return exited.pop(), 0
+    monkeypatch.setattr(server, "spawn", spawn)
+    monkeypatch.setattr(server.os, "kill", kill)
+    monkeypatch.setattr(server.os, "wait", wait)
+    handlers = signal.getsignal(signal.SIGTERM), signal.getsignal(signal.SIGINT)
+    yield spawned, killed
+    signal.signal(signal.SIGTERM, handlers[0])
+    signal.signal(signal.SIGINT, handlers[1])
+
+def test_signal_during_filter_build_starts_no_worker(master, monkeypatch):
+    spawned, killed = master
+    monkeypatch.setattr(server, "close_graph", lambda: None)
+    monkeypatch.setattr(server, "build_existence_filter",
+                        lambda: server.os.kill(os.getpid(), signal.SIGTERM))
+    server.main(["--port", "0", "--workers", "2"])
+    assert spawned == []
+
+def test_signal_right_after_fork_stops_the_new_worker(master, monkeypatch):
+    spawned, killed = master
+    monkeypatch.setenv("FLASK_EXISTENCE_FILTER", "false")
+    spawn = server.spawn
+
+    def spawn_then_signal(sock, args):
+        # SIGTERM reçu entre le fork et workers.add
+        pid = spawn(sock, args)
+        os.kill(os.getpid(), signal.SIGTERM)
+        return pid
+    monkeypatch.setattr(server, "spawn", spawn_then_signal)
+    server.main(["--port", "0", "--workers", "3"])
+    assert spawned == killed == [100000]
@@ -0,0 +1,105 @@
+from concurrent.futures import ThreadPoolExecutor
+from threading import Event
+import asyncio
+import time
+
+import pytest
+
+import singleflight
+
+@pytest.fixture(autouse=True)
+def reset():
+    singleflight.reset()
+
+def stats(key):
+    return next(entry for entry in singleflight.snapshot() if entry["key"] == key)
+
+def wait_shared(key, count=1):
+    # Attend que les appelants aient rejoint l'appel en cours
+    deadline = time.monotonic() + 5
+    while stats(key)["shared"] < count and time.monotonic() < deadline:
+        time.sleep(0.001)
+
+def start_leader(pool, key, result="result", error=None):
+    # Le meneur bloque jusqu'à release.set()
+    started, release = Event(), Event()
+
+    def fn():
+        started.set()
+        release.wait(5)
+        if error:
+            raise error
+        return result
+    future = pool.submit(singleflight.do, key, fn)
+    started.wait(5)
+    return future, release
+
+def test_leader_runs_fn():
+    assert singleflight.do("leader", lambda: 42) == 42
+    assert stats("leader")["queries"] == 1
+
+def test_waiter_shares_the_leader_result():
+    calls = []
+    with ThreadPoolExecutor(2) as pool:
+        leader, release = start_leader(pool, "shared")
+        waiter = pool.submit(singleflight.do, "shared", lambda: calls.append(1))
+        wait_shared("shared")
+        release.set()
+        assert leader.result(5) == "result"
+        assert waiter.result(5) == "result"
+    assert not calls
+    assert stats("shared")["shared"] == 1
+    assert stats("shared")["queries"] == 1
+
+def test_waiter_runs_fn_after_timeout():
+    with ThreadPoolExecutor(1) as pool:
+        leader, release = start_leader(pool, "slow")
+        assert singleflight.do("slow", lambda: "own", timeout=0.01) == "own"
+        release.set()
+        assert leader.result(5) == "result"
+    assert stats("slow")["timeouts"] == 1
+
+def test_error_reaches_leader_and_waiters():
+    with ThreadPoolExecutor(2) as pool:
+        leader, release = start_leader(pool, "error", error=RuntimeError("boom"))
+        waiter = pool.submit(singleflight.do, "error", lambda: "unused")
+        wait_shared("error")
+        release.set()
+        with pytest.raises(RuntimeError):
+            leader.result(5)
+        with pytest.raises(RuntimeError):
+            waiter.result(5)
+    # La clé est libérée : l'appel suivant exécute fn
+    assert singleflight.do("error", lambda: "again") == "again"
+
+def test_async_waiter_shares_the_leader_result():
+    with ThreadPoolExecutor(1) as pool:
+        leader, release = start_leader(pool, "async")
+
+        async def wait():
+            task = asyncio.create_task(singleflight.do_async("async", lambda: "unused"))
+            while stats("async")["shared"] < 1:
+                await asyncio.sleep(0.001)
+            release.set()
+            return await task
+        assert asyncio.run(wait()) == "result"
+        assert leader.result(5) == "result"
+
+def test_async_timeout_does_not_cancel_the_shared_call():
+    with ThreadPoolExecutor(2) as pool:
+        leader, release = start_leader(pool, "async-slow")
+        sync_waiter = pool.submit(singleflight.do, "async-slow", lambda: "unused", 5)
+        wait_shared("async-slow")
+        own = asyncio.run(singleflight.do_async("async-slow", lambda: "own", timeout=0.01))
+        assert own == "own"
+        release.set()
+        assert leader.result(5) == "result"
+        assert sync_waiter.result(5) == "result"
+    assert stats("async-slow")["timeouts"] == 1
+
+def test_coalesced_keys_on_arguments():
+    @singleflight.coalesced
+    def double(value):
+        return value * 2
+    assert double(2) == 4
+    assert double(value=3) == 6
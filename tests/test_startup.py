@@ -0,0 +1,47 @@
+import os
+import subprocess
+import sys
+
+# Budget d'import de app à froid (python -X importtime), en millisecondes
+IMPORT_BUDGET_MS = 2000
+
+# Modules lourds chargés seulement au premier usage
+DEFERRED = ("py2neo", "interchange", "pygments", "numpy")
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def import_app():
+    # Nouveau processus : aucun module déjà importé par pytest
+    check = "import sys, app; print(','.join(m for m in %r if m in sys.modules))" % (DEFERRED,)
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+    return subprocess.run([sys.executable, "-X", "importtime", "-c", check], cwd=ROOT, env=env,
+                          capture_output=True, text=True, check=True)
+
+def cumulative_ms(stderr, module):
+    # Lignes "import time: self [us] | cumulative | module", le module
+    # importé directement précédé d'une seule espace
+    for line in stderr.splitlines():
+        fields = line.split("|")
+        if line.startswith("import time:") and fields[-1] == " " + module:
+            return int(fields[1]) / 1000
+    raise AssertionError(f"{module} not imported")
+
+def test_import_does_not_load_heavy_modules():
+    assert import_app().stdout.strip() == ""
+
+def test_import_time_budget():
+    assert cumulative_ms(import_app().stderr, "app") < IMPORT_BUDGET_MS
+
+def test_flask_commands_skip_warmup(graph, monkeypatch):
+    from app import create_app
+    monkeypatch.setenv("FLASK_RUN_FROM_CLI", "true")
+    app = create_app()
+    assert "warmup_report" not in app.extensions
+    assert not graph.calls
+
+def test_warmup_outside_flask_commands(graph, monkeypatch):
+    from app import create_app
+    monkeypatch.delenv("FLASK_RUN_FROM_CLI", raising=False)
+    app = create_app()
+    assert app.extensions["warmup_report"]["failures"] == {}
+    assert graph.calls